@@ -2,6 +2,11 @@ import json
 import os
 from fastapi import APIRouter, HTTPException
 
+from config import REVIEW_MAX_BATCH
+from utils.inference_pool import inference_pool
+from ..utils.schemas import ReviewScoreRequest, ReviewBatchRequest, ReviewScoreResponse, ReviewBatchResponse
+from ..utils.sentiment import score_reviews
+
 router = APIRouter(
     prefix="/reviews",
     tags=["Fake Review Detection"]
@@ -57,4 +62,26 @@ async def get_review_stats_report():
         raise HTTPException(
             status_code=404, 
             detail="Review stats report not found. Please run the bulk analysis script first."
-        )
\ No newline at end of file
+        )
+
+@router.post("/score", response_model=ReviewScoreResponse)
+async def score_review(review: ReviewScoreRequest):
+    """
+    Scores a single review at submission time.
+    - **is_suspicious**: True if the sentiment contradicts the star rating.
+    """
+    results = await inference_pool.run(score_reviews, [review])
+    return results[0]
+
+@router.post("/score_batch", response_model=ReviewBatchResponse)
+async def score_review_batch(batch: ReviewBatchRequest):
+    """
+    Scores up to REVIEW_MAX_BATCH reviews in one call, as one batched model pass.
+    """
+    if not batch.reviews:
+        raise HTTPException(status_code=400, detail="No reviews to score.")
+    if len(batch.reviews) > REVIEW_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {REVIEW_MAX_BATCH} reviews per batch.")
+
+    results = await inference_pool.run(score_reviews, batch.reviews)
+    return {"results": results}
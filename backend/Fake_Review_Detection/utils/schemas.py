@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import List
+
+# A single review as submitted by the storefront
+class ReviewScoreRequest(BaseModel):
+    review_title: str = ""
+    review_content: str
+    rating: float
+
+class ReviewBatchRequest(BaseModel):
+    reviews: List[ReviewScoreRequest]
+
+class ReviewScoreResponse(BaseModel):
+    review: str
+    rating: float
+    sentiment: str
+    is_suspicious: bool
+
+class ReviewBatchResponse(BaseModel):
+    results: List[ReviewScoreResponse]
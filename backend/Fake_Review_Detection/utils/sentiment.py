@@ -0,0 +1,71 @@
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from config import REVIEW_SENTIMENT_MODEL
+from models.backends import Forward, build_backend
+from models.batching import MicroBatcher
+from models.registry import registry
+
+# Same model and label order as ml_scripts/bulk_analyze_reviews.py
+LABELS = ['negative', 'neutral', 'positive']
+
+
+def load_sentiment_model():
+    tokenizer = AutoTokenizer.from_pretrained(REVIEW_SENTIMENT_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(REVIEW_SENTIMENT_MODEL)
+    model.eval()
+    # ⚡ Optional int8 / ONNX Runtime backend, checked against the fp32 logits
+    example = tokenizer(
+        ["Terrible, broke after a day.", "Great value, works exactly as described and arrived early."],
+        return_tensors="pt", padding=True
+    )
+    classifier = build_backend(
+        "review_sentiment", Forward(model, output_attr="logits"),
+        (example["input_ids"], example["attention_mask"]), ["input_ids", "attention_mask"],
+        version=REVIEW_SENTIMENT_MODEL.replace("/", "-")
+    )
+    return tokenizer, classifier
+
+
+# 📦 Loaded once and kept warm for the lifetime of the server
+registry.register("review_sentiment", load_sentiment_model)
+
+
+# 🧮 Batched forward pass: concurrent review submissions share one RoBERTa call
+def _classify_reviews(texts):
+    tokenizer, classifier = registry.get("review_sentiment")
+    inputs = tokenizer(texts, return_tensors="pt", max_length=512, truncation=True, padding=True)
+    with torch.inference_mode():
+        predictions = classifier(inputs["input_ids"], inputs["attention_mask"]).argmax(dim=1).tolist()
+    return [LABELS[p] for p in predictions]
+
+
+_sentiment_classifier = MicroBatcher("review_sentiment", _classify_reviews)
+
+
+def build_review_text(title, content):
+    return (f"{title or ''}. {content.strip()}").strip()
+
+
+def detect_mismatch(sentiment, rating):
+    # Same rule as the offline bulk analysis
+    return (sentiment == 'negative' and rating >= 4.0) or (sentiment == 'positive' and rating <= 2.0)
+
+
+def score_reviews(reviews):
+    """
+    Score a list of ReviewScoreRequest. All texts are queued before waiting, so they
+    are batched together (and with any concurrent requests).
+    """
+    texts = [build_review_text(r.review_title, r.review_content) for r in reviews]
+    futures = [_sentiment_classifier.submit(text) for text in texts]
+    results = []
+    for review, text, future in zip(reviews, texts, futures):
+        sentiment = future.result()
+        results.append({
+            "review": text,
+            "rating": review.rating,
+            "sentiment": sentiment,
+            "is_suspicious": detect_mismatch(sentiment, review.rating),
+        })
+    return results
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, String, TIMESTAMP, JSON, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Float
+from sqlalchemy import Float, Integer, Boolean, Index, false
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
 
@@ -30,4 +30,22 @@ class TrustScore(Base):
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.product_id"), primary_key=True)
     seller_id = Column(UUID(as_uuid=True))
     score = Column(Float)
-    last_updated = Column(TIMESTAMP)
\ No newline at end of file
+    # Counters the score is derived from, maintained with every state transition
+    return_count = Column(Integer, nullable=False, default=0, server_default="0")
+    flagged_fraud = Column(Boolean, nullable=False, default=False, server_default=false())
+    last_updated = Column(TIMESTAMP)
+
+    # A seller's products, worst first
+    __table_args__ = (Index("ix_trust_scores_seller_score", "seller_id", "score"),)
+
+class SellerTrustScore(Base):
+    """Per-seller aggregate of the stored product trust scores, kept in step with them."""
+    __tablename__ = "seller_trust_scores"
+    seller_id = Column(UUID(as_uuid=True), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    avg_score = Column(Float)
+    last_updated = Column(TIMESTAMP)
+
+    # Top-K / range queries over sellers by average trust
+    __table_args__ = (Index("ix_seller_trust_scores_avg", "avg_score", "seller_id"),)
\ No newline at end of file
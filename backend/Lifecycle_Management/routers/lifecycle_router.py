@@ -1,22 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime
+from datetime import datetime, timedelta
 from uuid import UUID
-from typing import List
+from typing import List, Literal, Optional
 
 # --- THIS IS THE FIX ---
 # Import the specific modules you need using relative paths.
 # The two dots (..) go up one directory from `routers/` to `Lifecycle_Management/`.
-from ..db import SessionLocal
+from ..db import SessionLocal, engine
 from .. import models, schemas # <-- This line imports your models.py and schemas.py
-from ..utils.trust_score import compute_trust_score
+from ..utils.trust_score import apply_transitions, backfill_trust_scores, ensure_trust_schema, get_trust_score
 
 router = APIRouter(
     prefix="/lifecycle", # Added prefix for better organization
     tags=["Product Lifecycle"]
 )
 
+@router.on_event("startup")
+async def prepare_trust_tables():
+    await ensure_trust_schema(engine)
+
 # This get_db function is now correctly defined here
 async def get_db():
     async with SessionLocal() as session:
@@ -28,37 +33,113 @@ valid_transitions = {
     "returned": ["flagged_fraud"], "flagged_fraud": []
 }
 
+# Bulk requests: upper bound on transitions per call, and on ids per IN (...) lookup
+MAX_BULK_TRANSITIONS = 10000
+PREFETCH_CHUNK = 5000
+
+def _new_product(data: schemas.StateTransition):
+    # For a hackathon demo, it's useful to create a product if it doesn't exist
+    return models.Product(product_id=data.product_id, seller_id=data.seller_id, current_state="listed")
+
+def _log_row(product, data: schemas.StateTransition, timestamp):
+    """
+    Validates one transition against the product's current state. Returns the
+    LifecycleLog values (and moves the product to the new state), or None if invalid.
+    """
+    if data.new_state not in valid_transitions.get(product.current_state, []):
+        return None
+    row = {
+        "product_id": data.product_id,
+        "seller_id": data.seller_id,
+        "previous_state": product.current_state,
+        "current_state": data.new_state,
+        "timestamp": timestamp,
+        "extra_metadata": data.metadata or {},
+    }
+    product.current_state = data.new_state
+    return row
+
 @router.post("/product/state-transition")
 async def transition_product_state(data: schemas.StateTransition, db: AsyncSession = Depends(get_db)):
     # The `data` parameter now correctly resolves `schemas.StateTransition`
     
     product = await db.get(models.Product, data.product_id)
     if not product:
-        # For a hackathon demo, it's useful to create a product if it doesn't exist
         print(f"DEBUG: Product {data.product_id} not found, creating it.")
-        product = models.Product(id=data.product_id, current_state="listed")
+        product = _new_product(data)
         db.add(product)
         # In a real app, you might raise this error instead:
         # raise HTTPException(status_code=404, detail="Product not found")
 
-    if data.new_state not in valid_transitions.get(product.current_state, []):
+    row = _log_row(product, data, datetime.utcnow())
+    if row is None:
         raise HTTPException(status_code=400, detail="Invalid state transition")
 
-    # This line now correctly resolves `models.LifecycleLog`
-    log = models.LifecycleLog(
-        product_id=data.product_id,
-        seller_id=data.seller_id,
-        previous_state=product.current_state,
-        current_state=data.new_state,
-        timestamp=datetime.utcnow(),
-        extra_metadata=str(data.metadata) # Store as string for SQLite compatibility
-    )
-
-    product.current_state = data.new_state
-    db.add(log)
+    db.add(models.LifecycleLog(**row))
+    await db.flush()
+    # Trust score counters change in the same transaction as the log
+    await apply_transitions(db, [row], {product.product_id: product})
     await db.commit()
     return {"message": "Transition successful"}
 
+@router.post("/products/state-transitions", response_model=schemas.BulkTransitionResponse)
+async def transition_product_states(batch: schemas.BulkStateTransition, db: AsyncSession = Depends(get_db)):
+    """
+    Applies many transitions (e.g. a replay of the order event stream) in one transaction.
+    Transitions are validated in request order, so a product can move through several
+    states in one batch; invalid ones are reported per item and do not fail the batch.
+    """
+    if len(batch.transitions) > MAX_BULK_TRANSITIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_TRANSITIONS} transitions per request.")
+
+    # 🚀 One IN (...) lookup per chunk instead of one db.get per event. The rows stay
+    # locked until commit, so a concurrent request cannot validate against a stale state;
+    # ids are sorted so two batches always lock in the same order and cannot deadlock.
+    product_ids = sorted(set(t.product_id for t in batch.transitions))
+    products = {}
+    for i in range(0, len(product_ids), PREFETCH_CHUNK):
+        result = await db.execute(
+            select(models.Product)
+            .where(models.Product.product_id.in_(product_ids[i:i + PREFETCH_CHUNK]))
+            .order_by(models.Product.product_id).with_for_update()
+        )
+        products.update((p.product_id, p) for p in result.scalars())
+
+    # One microsecond apart, so the log reads back in request order (get_lifecycle orders by timestamp)
+    now = datetime.utcnow()
+    log_rows, results, created = [], [], {}
+    for index, data in enumerate(batch.transitions):
+        product = products.get(data.product_id)
+        if product is None:
+            product = products[data.product_id] = created[data.product_id] = _new_product(data)
+
+        previous_state = product.current_state
+        row = _log_row(product, data, now + timedelta(microseconds=index))
+        if row is None:
+            results.append({
+                "index": index, "product_id": data.product_id, "applied": False,
+                "previous_state": previous_state,
+                "detail": f"Invalid state transition: {previous_state} -> {data.new_state}"
+            })
+            continue
+        log_rows.append(row)
+        results.append({
+            "index": index, "product_id": data.product_id, "applied": True,
+            "previous_state": previous_state, "current_state": data.new_state
+        })
+
+    # As with the single route, unknown products are only kept if a transition applied to them.
+    # New products and state changes are flushed first, then the logs go in as one bulk INSERT.
+    applied_ids = {row["product_id"] for row in log_rows}
+    db.add_all([p for product_id, p in created.items() if product_id in applied_ids])
+    await db.flush()
+    if log_rows:
+        await db.execute(insert(models.LifecycleLog), log_rows)
+        await apply_transitions(db, log_rows, products)
+    await db.commit()
+
+    return {"applied": len(log_rows), "rejected": len(results) - len(log_rows), "results": results}
+
 @router.get(
     "/product/{product_id}/lifecycle",
     response_model=List[schemas.LifecycleLogResponse] # This now resolves correctly
@@ -72,7 +153,86 @@ async def get_lifecycle(product_id: UUID, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="No lifecycle logs found for this product.")
     return logs
 
-@router.get("/product/{product_id}/trust-score")
+@router.get("/product/{product_id}/trust-score", response_model=schemas.TrustScoreResponse)
 async def get_score(product_id: UUID, db: AsyncSession = Depends(get_db)):
-    score, reasons = await compute_trust_score(db, product_id)
-    return { "product_id": product_id, "score": score, "reasons": reasons }
\ No newline at end of file
+    # Maintained on every transition, so this is a primary-key read with no writes
+    trust = await get_trust_score(db, product_id)
+    if trust is None:
+        raise HTTPException(status_code=404, detail="Product not found.")
+    score, reasons = trust
+    return { "product_id": product_id, "score": score, "reasons": reasons }
+
+# 🔁 Rebuild stored trust scores from the full log history (e.g. after deploying the counters)
+backfill_status = {"running": False, "products": 0, "started_at": None, "finished_at": None, "error": None}
+
+@router.post("/trust-scores/backfill", status_code=202)
+async def start_trust_score_backfill(background_tasks: BackgroundTasks):
+    if backfill_status["running"]:
+        raise HTTPException(status_code=409, detail="A backfill is already running.")
+    backfill_status["running"] = True
+    background_tasks.add_task(backfill_trust_scores, SessionLocal, backfill_status)
+    return backfill_status
+
+@router.get("/trust-scores/backfill")
+async def get_trust_score_backfill():
+    return backfill_status
+
+# 🏪 Seller-level trust, read from the aggregates maintained with the product scores
+@router.get("/seller/{seller_id}/trust-score", response_model=schemas.SellerTrustDetailResponse)
+async def get_seller_score(
+    seller_id: UUID,
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    The seller's average trust over their scored products, plus one page of those
+    products, lowest score first.
+    """
+    seller = await db.get(models.SellerTrustScore, seller_id)
+    if seller is None:
+        raise HTTPException(status_code=404, detail="No trust scores recorded for this seller.")
+
+    result = await db.execute(
+        select(models.TrustScore)
+        .where(models.TrustScore.seller_id == seller_id)
+        .order_by(models.TrustScore.score, models.TrustScore.product_id)
+        .limit(limit).offset(offset)
+    )
+    return {
+        "seller_id": seller.seller_id,
+        "product_count": seller.product_count,
+        "avg_score": seller.avg_score,
+        "last_updated": seller.last_updated,
+        "limit": limit,
+        "offset": offset,
+        "products": result.scalars().all(),
+    }
+
+@router.get("/sellers/ranked", response_model=schemas.RankedSellersResponse)
+async def get_ranked_sellers(
+    order: Literal["asc", "desc"] = "asc",
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    min_products: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Sellers ranked by average trust score (worst first by default), optionally
+    restricted to a score range. Served from the (avg_score, seller_id) index.
+    """
+    seller = models.SellerTrustScore
+    query = select(seller).where(seller.avg_score.isnot(None), seller.product_count >= min_products)
+    if min_score is not None:
+        query = query.where(seller.avg_score >= min_score)
+    if max_score is not None:
+        query = query.where(seller.avg_score <= max_score)
+    if order == "asc":
+        query = query.order_by(seller.avg_score, seller.seller_id)
+    else:
+        query = query.order_by(seller.avg_score.desc(), seller.seller_id.desc())
+
+    result = await db.execute(query.limit(limit).offset(offset))
+    return {"limit": limit, "offset": offset, "sellers": result.scalars().all()}
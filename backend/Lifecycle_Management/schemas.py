@@ -1,5 +1,5 @@
 from pydantic import BaseModel, UUID4
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from uuid import UUID
 from datetime import datetime
 
@@ -29,4 +29,49 @@ class LifecycleLogResponse(BaseModel):
 class TrustScoreResponse(BaseModel):
     product_id: UUID4
     score: float
-    reasons: Optional[Dict] = {}
\ No newline at end of file
+    reasons: Optional[Dict] = {}
+
+class BulkStateTransition(BaseModel):
+    transitions: List[StateTransition]
+
+class TransitionResult(BaseModel):
+    index: int
+    product_id: UUID4
+    applied: bool
+    previous_state: Optional[str] = None
+    current_state: Optional[str] = None
+    detail: Optional[str] = None
+
+class BulkTransitionResponse(BaseModel):
+    applied: int
+    rejected: int
+    results: List[TransitionResult]
+
+
+class ProductTrustEntry(BaseModel):
+    product_id: UUID4
+    score: float
+    return_count: int
+    flagged_fraud: bool
+
+    class Config:
+        orm_mode = True
+
+class SellerTrustResponse(BaseModel):
+    seller_id: UUID4
+    product_count: int
+    avg_score: Optional[float] = None
+    last_updated: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class SellerTrustDetailResponse(SellerTrustResponse):
+    limit: int
+    offset: int
+    products: List[ProductTrustEntry]
+
+class RankedSellersResponse(BaseModel):
+    limit: int
+    offset: int
+    sellers: List[SellerTrustResponse]
@@ -1,30 +1,278 @@
+from sqlalchemy import false, func, literal, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.future import select
-from app.models import LifecycleLog, Product, TrustScore
+from ..models import Base, LifecycleLog, Product, SellerTrustScore, TrustScore
 from datetime import datetime
 
-async def compute_trust_score(db, product_id):
-    result = await db.execute(select(LifecycleLog).where(LifecycleLog.product_id == product_id))
-    logs = result.scalars().all()
+BASE_SCORE = 100
+PENALTIES = {"flagged_fraud": -30, "multiple_returns": -20}
 
-    score = 100
+# Products per transaction when rebuilding scores from the log history
+BACKFILL_CHUNK = 5000
+# Rows per multi-row INSERT, to stay well under asyncpg's 32767 bind parameters
+WRITE_CHUNK = 1000
+
+
+def _chunks(items, size=WRITE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def score_from_counters(return_count, flagged_fraud):
+    """The trust score and its reasons, from the per-product counters."""
+    score = BASE_SCORE
     reasons = {}
 
-    if any(log.current_state == "flagged_fraud" for log in logs):
-        score -= 30
-        reasons["flagged_fraud"] = -30
+    if flagged_fraud:
+        score += PENALTIES["flagged_fraud"]
+        reasons["flagged_fraud"] = PENALTIES["flagged_fraud"]
+
+    if return_count >= 2:
+        score += PENALTIES["multiple_returns"]
+        reasons["multiple_returns"] = PENALTIES["multiple_returns"]
+
+    return max(0, score), reasons
+
+
+async def apply_transitions(db, log_rows, products):
+    """
+    Updates the counters and stored score of every product in `log_rows` (LifecycleLog
+    values about to be written in the same transaction). `products` maps product_id
+    to the Product row, for the seller of products without a score yet.
+    The score rows are locked until the caller commits, so concurrent transitions
+    for a product are applied one after the other. The sellers' aggregates are
+    adjusted by the score changes in the same transaction.
+    """
+    product_ids = sorted(set(row["product_id"] for row in log_rows))
+    if not product_ids:
+        return {}
+
+    now = datetime.utcnow()
+    # Rows for products scored for the first time (with no score yet). ON CONFLICT makes
+    # concurrent first transitions of a product wait for each other instead of failing.
+    for chunk in _chunks(product_ids):
+        await db.execute(
+            insert(TrustScore).values([
+                {"product_id": product_id, "seller_id": products[product_id].seller_id,
+                 "return_count": 0, "flagged_fraud": False, "last_updated": now}
+                for product_id in chunk
+            ]).on_conflict_do_nothing(index_elements=[TrustScore.product_id])
+        )
+    # Locks taken in key order (chunks too), so concurrent batches cannot deadlock each other
+    scores = {}
+    for chunk in _chunks(product_ids):
+        result = await db.execute(
+            select(TrustScore).where(TrustScore.product_id.in_(chunk))
+            .order_by(TrustScore.product_id).with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        scores.update((s.product_id, s) for s in result.scalars())
+    previous = {product_id: trust.score for product_id, trust in scores.items()}
+
+    for row in log_rows:
+        trust = scores[row["product_id"]]
+        if row["current_state"] == "returned":
+            trust.return_count += 1
+        elif row["current_state"] == "flagged_fraud":
+            trust.flagged_fraud = True
+
+    # seller_id -> [products, score sum] of the touched products before and after this transaction
+    seller_changes = {}
+    for product_id in product_ids:
+        trust = scores[product_id]
+        trust.score, _ = score_from_counters(trust.return_count, trust.flagged_fraud)
+        trust.last_updated = now
+
+        before, after = seller_changes.setdefault(trust.seller_id, ([0, 0.0], [0, 0.0]))
+        if previous[product_id] is not None:
+            before[0] += 1
+            before[1] += previous[product_id]
+        after[0] += 1
+        after[1] += trust.score
+
+    await _update_sellers(db, seller_changes, now)
+    return scores
+
+
+async def _update_sellers(db, seller_changes, now):
+    changed = sorted(
+        (seller_id, before, after) for seller_id, (before, after) in seller_changes.items()
+        if seller_id is not None and before != after
+    )
+    if not changed:
+        return
+    # The aggregates below read trust_scores, which must include this transaction's scores
+    await db.flush()
+
+    # A seller without an aggregate row yet is seeded from all of its stored product scores
+    # (this transaction's included); RETURNING tells which rows were seeded, and those
+    # already hold the change. ON CONFLICT waits for a concurrent seed and then skips.
+    seeded = set()
+    for chunk in _chunks([seller_id for seller_id, _, _ in changed]):
+        aggregates = _seller_aggregates().where(TrustScore.seller_id.in_(chunk))
+        stmt = insert(SellerTrustScore).from_select(
+            ["seller_id", "product_count", "score_sum", "avg_score", "last_updated"], aggregates
+        ).on_conflict_do_nothing(index_elements=[SellerTrustScore.seller_id])
+        seeded.update((await db.execute(stmt.returning(SellerTrustScore.seller_id))).scalars())
+
+    # Increments happen in SQL, so concurrent transactions for one seller add up correctly
+    deltas = [
+        {"seller_id": seller_id, "product_count": after[0] - before[0], "score_sum": after[1] - before[1],
+         "avg_score": None, "last_updated": now}
+        for seller_id, before, after in changed if seller_id not in seeded
+    ]
+    for chunk in _chunks(deltas):
+        stmt = insert(SellerTrustScore).values(chunk)
+        product_count = SellerTrustScore.product_count + stmt.excluded.product_count
+        score_sum = SellerTrustScore.score_sum + stmt.excluded.score_sum
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SellerTrustScore.seller_id],
+            set_={
+                "product_count": product_count,
+                "score_sum": score_sum,
+                "avg_score": score_sum / func.nullif(product_count, 0),
+                "last_updated": stmt.excluded.last_updated,
+            },
+        ))
+
+
+def _seller_aggregates():
+    """Per-seller count, sum and average of the stored product scores."""
+    return select(
+        TrustScore.seller_id,
+        func.count(TrustScore.score).label("product_count"),
+        func.coalesce(func.sum(TrustScore.score), 0.0).label("score_sum"),
+        func.avg(TrustScore.score).label("avg_score"),
+        func.now().label("last_updated"),
+    ).where(TrustScore.seller_id.isnot(None)).group_by(TrustScore.seller_id)
+
+
+async def get_trust_score(db, product_id):
+    """
+    Stored score for a product: a single primary-key lookup, no writes.
+    Returns None for unknown products.
+    """
+    trust = await db.get(TrustScore, product_id)
+    if trust is not None:
+        return score_from_counters(trust.return_count, trust.flagged_fraud)
+    # No transitions recorded yet: the product has the full base score
+    if await db.get(Product, product_id) is not None:
+        return BASE_SCORE, {}
+    return None
+
+
+async def ensure_trust_schema(engine):
+    """
+    Creates missing tables and brings trust_scores up to date in place
+    (this service has no migration tool), and fills seller_trust_scores
+    the first time it exists next to stored product scores.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(
+            "ALTER TABLE trust_scores "
+            "ADD COLUMN IF NOT EXISTS return_count INTEGER NOT NULL DEFAULT 0, "
+            "ADD COLUMN IF NOT EXISTS flagged_fraud BOOLEAN NOT NULL DEFAULT FALSE"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_trust_scores_seller_score ON trust_scores (seller_id, score)"
+        ))
+        # Seller aggregates introduced on a database that already has product scores: fill them once
+        sellers_empty = (await conn.execute(select(SellerTrustScore.seller_id).limit(1))).first() is None
+        if sellers_empty and (await conn.execute(select(TrustScore.product_id).limit(1))).first() is not None:
+            print("Building seller trust aggregates from the stored product scores...")
+            await rebuild_seller_scores(conn)
+
+
+async def backfill_trust_scores(session_factory, status):
+    """
+    Rebuilds every product's counters and score from the full lifecycle log, a chunk of
+    products per transaction (keyset-paginated on product_id), then the seller
+    aggregates from the product scores. Progress goes into `status`.
+    """
+    status.update(running=True, products=0, started_at=datetime.utcnow().isoformat(), finished_at=None, error=None)
+    try:
+        async with session_factory() as db:
+            last_id = None
+            while True:
+                query = (
+                    select(LifecycleLog.product_id)
+                    .group_by(LifecycleLog.product_id)
+                    .order_by(LifecycleLog.product_id)
+                    .limit(BACKFILL_CHUNK)
+                )
+                if last_id is not None:
+                    query = query.where(LifecycleLog.product_id > last_id)
+                product_ids = (await db.execute(query)).scalars().all()
+                if not product_ids:
+                    break
+
+                # Lock the chunk's score rows (creating missing ones) before counting, so a
+                # live transition either is counted here or waits and applies on top of it
+                await db.execute(
+                    insert(TrustScore).from_select(
+                        ["product_id", "seller_id", "return_count", "flagged_fraud"],
+                        select(Product.product_id, Product.seller_id, literal(0), false())
+                        .where(Product.product_id.in_(product_ids)).order_by(Product.product_id)
+                    ).on_conflict_do_nothing(index_elements=[TrustScore.product_id])
+                )
+                await db.execute(
+                    select(TrustScore.product_id).where(TrustScore.product_id.in_(product_ids))
+                    .order_by(TrustScore.product_id).with_for_update()
+                )
+                rows = (await db.execute(
+                    select(
+                        LifecycleLog.product_id,
+                        Product.seller_id,
+                        func.count().filter(LifecycleLog.current_state == "returned").label("return_count"),
+                        func.bool_or(LifecycleLog.current_state == "flagged_fraud").label("flagged_fraud"),
+                    )
+                    .join(Product, Product.product_id == LifecycleLog.product_id)
+                    .where(LifecycleLog.product_id.in_(product_ids))
+                    .group_by(LifecycleLog.product_id, Product.seller_id)
+                )).all()
+
+                now = datetime.utcnow()
+                values = []
+                for product_id, seller_id, return_count, flagged_fraud in rows:
+                    score, _ = score_from_counters(return_count, bool(flagged_fraud))
+                    values.append({
+                        "product_id": product_id, "seller_id": seller_id, "score": score,
+                        "return_count": return_count, "flagged_fraud": bool(flagged_fraud), "last_updated": now,
+                    })
+                for chunk in _chunks(values):
+                    stmt = insert(TrustScore).values(chunk)
+                    await db.execute(stmt.on_conflict_do_update(
+                        index_elements=[TrustScore.product_id],
+                        set_={column: stmt.excluded[column] for column in
+                              ("seller_id", "score", "return_count", "flagged_fraud", "last_updated")},
+                    ))
+                await db.commit()
+
+                last_id = product_ids[-1]
+                status["products"] += len(values)
 
-    if sum(1 for log in logs if log.current_state == "returned") >= 2:
-        score -= 20
-        reasons["multiple_returns"] = -20
+            await rebuild_seller_scores(db)
+            await db.commit()
+    except Exception as e:
+        print(f"[ERROR] Trust score backfill failed: {e}")
+        status["error"] = str(e)
+    finally:
+        status.update(running=False, finished_at=datetime.utcnow().isoformat())
 
-    score = max(0, score)
-    product = await db.get(Product, product_id)
 
-    db.merge(TrustScore(
-        product_id=product_id,
-        seller_id=product.seller_id,
-        score=score,
-        last_updated=datetime.utcnow()
+async def rebuild_seller_scores(db):
+    """
+    Recomputes every seller aggregate with one GROUP BY over trust_scores. The table is
+    locked against writes until the caller commits: transitions still in flight are not
+    in the GROUP BY, so they wait and apply their change on top of the rebuilt rows.
+    """
+    await db.execute(text("LOCK TABLE seller_trust_scores IN EXCLUSIVE MODE"))
+    stmt = insert(SellerTrustScore).from_select(
+        ["seller_id", "product_count", "score_sum", "avg_score", "last_updated"], _seller_aggregates()
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[SellerTrustScore.seller_id],
+        set_={column: stmt.excluded[column] for column in
+              ("product_count", "score_sum", "avg_score", "last_updated")},
     ))
-    await db.commit()
-    return score, reasons
\ No newline at end of file
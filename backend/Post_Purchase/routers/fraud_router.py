@@ -1,26 +1,119 @@
 import os
 import json
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.concurrency import run_in_threadpool
+from config import FRAUD_MAX_BATCH
+from utils.inference_pool import inference_pool
 from ..utils.scoring import scoring_service # Relative imports
-from ..utils.schemas import CustomerFeatures, FraudScoreResponse
+from ..utils.feature_store import feature_store
+from ..utils.schemas import (
+    CustomerFeatures, FraudScoreResponse, CustomerBatchRequest, FraudBatchResponse,
+    InvoiceEvent, InvoiceEventBatch, IngestResponse
+)
 
 router = APIRouter(
     prefix="/post-purchase",
     tags=["Post-Purchase Fraud Detection"]
 )
 
+def _resolve_features(customer_ids, features):
+    """
+    Fills in missing features from the feature store; 404 if a customer has neither.
+    """
+    missing = [c for c, f in zip(customer_ids, features) if f is None]
+    if not missing:
+        return features
+    stored = feature_store.get_many(missing)
+    unknown = [c for c in missing if c not in stored]
+    if unknown:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No features or transaction history for customers: {unknown[:20]}"
+        )
+    return [f if f is not None else CustomerFeatures(**stored[c]) for c, f in zip(customer_ids, features)]
+
+
 @router.post("/score_customer/{customer_id}", response_model=FraudScoreResponse)
-async def score_customer_risk(customer_id: str, features: CustomerFeatures):
+async def score_customer_risk(customer_id: str, features: Optional[CustomerFeatures] = Body(None)):
     """
     Analyzes a customer's features to provide a fraud/refund abuse risk score.
+    Without a body, the features come from the customer's ingested invoices.
     - **anomaly_score**: A lower score indicates a higher risk.
     - **is_anomaly**: True if the customer is flagged as an outlier.
     """
     if scoring_service.model is None:
         raise HTTPException(status_code=503, detail="Fraud detection model is not available.")
-    
-    result = scoring_service.score_customer(customer_id, features)
-    return result
+
+    if features is None:
+        # The feature store is SQLite, so the lookup stays off the event loop
+        features = (await run_in_threadpool(_resolve_features, [customer_id], [features]))[0]
+    # Scoring one row takes microseconds: done inline, not queued behind image inference
+    return scoring_service.score_customer(customer_id, features)
+
+@router.post("/score_customers", response_model=FraudBatchResponse)
+async def score_customers_risk(batch: CustomerBatchRequest):
+    """
+    Scores up to FRAUD_MAX_BATCH customers in one call, as a single array
+    (e.g. for re-scoring the whole customer base overnight).
+    Results come back in request order.
+    """
+    if scoring_service.model is None:
+        raise HTTPException(status_code=503, detail="Fraud detection model is not available.")
+    if not batch.customers:
+        raise HTTPException(status_code=400, detail="No customers to score.")
+    if len(batch.customers) > FRAUD_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {FRAUD_MAX_BATCH} customers per batch.")
+
+    def score():
+        customer_ids = [c.customer_id for c in batch.customers]
+        features = _resolve_features(customer_ids, [c.features for c in batch.customers])
+        return scoring_service.score_customers(customer_ids, features)
+
+    results = await inference_pool.run(score)
+    return {"results": results}
+
+# 🧾 Feature store: invoice / return events from the order service
+def _event_record(event: InvoiceEvent) -> dict:
+    return {
+        "invoice_no": event.invoice_no,
+        "customer_id": event.customer_id,
+        "invoice_date": event.invoice_date,
+        "is_return": event.is_return if event.is_return is not None else event.invoice_no.startswith("C"),
+        "lines": [
+            {"stock_code": line.stock_code, "quantity": line.quantity, "unit_price": line.unit_price}
+            for line in event.lines
+        ],
+    }
+
+@router.post("/events/invoice", response_model=IngestResponse)
+async def ingest_invoice(event: InvoiceEvent):
+    """
+    Adds one invoice (or return) to the customer's running aggregates.
+    Replaying an invoice number already ingested is a no-op.
+    """
+    ingested = await run_in_threadpool(feature_store.ingest, [_event_record(event)])
+    return {"ingested": sum(ingested), "skipped": len(ingested) - sum(ingested)}
+
+@router.post("/events/batch", response_model=IngestResponse)
+async def ingest_invoice_batch(batch: InvoiceEventBatch):
+    """
+    Ingests many invoices in one transaction (e.g. a backfill of the order history).
+    """
+    if len(batch.events) > FRAUD_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {FRAUD_MAX_BATCH} events per batch.")
+    ingested = await run_in_threadpool(feature_store.ingest, [_event_record(e) for e in batch.events])
+    return {"ingested": sum(ingested), "skipped": len(ingested) - sum(ingested)}
+
+@router.get("/features/{customer_id}", response_model=CustomerFeatures)
+async def get_customer_features(customer_id: str):
+    """
+    The model features currently derived from the customer's ingested invoices.
+    """
+    features = await run_in_threadpool(feature_store.get_features, customer_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"No transaction history for customer '{customer_id}'.")
+    return features
 
 # Endpoint for list of suspicious
 @router.get("/suspicious_customers_report")
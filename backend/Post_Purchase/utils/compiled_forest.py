@@ -0,0 +1,178 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+EULER_GAMMA = 0.5772156649015329
+
+
+def average_path_length(n):
+    """
+    c(n): average path length of an unsuccessful BST search among n points,
+    as in sklearn.ensemble._iforest._average_path_length.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    c = np.zeros_like(n)
+    c[n == 2] = 1.0
+    big = n > 2
+    c[big] = 2.0 * (np.log(n[big] - 1.0) + EULER_GAMMA) - 2.0 * (n[big] - 1.0) / n[big]
+    return c
+
+
+class CompiledForest:
+    """
+    An sklearn IsolationForest flattened into contiguous node arrays.
+
+    All trees live in one set of arrays indexed by a global node id. Leaves point
+    to themselves, so every tree is walked for `max_depth` steps at once and rows
+    end on their leaf; `value` holds each leaf's depth plus c(n_node_samples),
+    which is what sklearn adds up per tree. `decision_function` matches
+    IsolationForest.decision_function, with no sklearn import at scoring time.
+    """
+
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+    CHUNK_ROWS = 4096
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, denominator, offset,
+                 n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.denominator = float(denominator)
+        self.offset = float(offset)
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        # sklearn only slices columns per tree when the trees saw a feature subset
+        subsample_features = forest._max_features != forest.n_features_in_
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        max_depth = 0
+        start = 0
+        for estimator, tree_features in zip(forest.estimators_, forest.estimators_features_):
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(start, start + n_nodes)
+
+            # Depth of every node (root = 0); children always come after their parent
+            depth = np.zeros(n_nodes, dtype=np.int64)
+            for node in range(n_nodes):
+                if not is_leaf[node]:
+                    depth[tree.children_left[node]] = depth[node] + 1
+                    depth[tree.children_right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+
+            feature = np.where(is_leaf, 0, tree.feature)
+            if subsample_features:
+                feature = np.asarray(tree_features)[feature]
+            features.append(feature)
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, own, tree.children_left + start))
+            rights.append(np.where(is_leaf, own, tree.children_right + start))
+            # Same expression (and float rounding) as sklearn: nodes on the path + c(n) - 1
+            values.append(np.where(is_leaf, (depth + 1) + average_path_length(tree.n_node_samples) - 1.0, 0.0))
+            roots.append(start)
+            start += n_nodes
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            denominator=len(forest.estimators_) * average_path_length([forest.max_samples_])[0],
+            offset=forest.offset_,
+            n_features=forest.n_features_in_,
+        )
+
+    def path_lengths(self, X):
+        """Summed path length over all trees, shape (n_samples,)."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n_samples, {self.n_features}), got {X.shape}")
+
+        if X.shape[0] > self.CHUNK_ROWS:
+            return np.concatenate([
+                self.path_lengths(X[i:i + self.CHUNK_ROWS]) for i in range(0, X.shape[0], self.CHUNK_ROWS)
+            ])
+
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)  # (n_trees, n_samples)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # cumsum adds tree by tree, in the same order (and rounding) as sklearn
+        return np.cumsum(self.value[nodes], axis=0)[-1]
+
+    def score_samples(self, X):
+        return -(2.0 ** (-self.path_lengths(X) / self.denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def save(self, path, **extra):
+        """Writes the forest, plus any extra arrays (e.g. scaler parameters), to an .npz file."""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            **{name: getattr(self, name) for name in self.ARRAYS},
+            max_depth=self.max_depth, denominator=self.denominator, offset=self.offset,
+            n_features=self.n_features, **extra
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Returns (forest, extra arrays saved alongside it)."""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        params = ("max_depth", "denominator", "offset", "n_features")
+        forest = cls(**{name: arrays.pop(name) for name in cls.ARRAYS + params})
+        return forest, arrays
+
+
+def compiled_path(model_path) -> Path:
+    """The compiled form lives next to the joblib artifact: model.joblib -> model.npz"""
+    return Path(model_path).with_suffix(".npz")
+
+
+def build_compiled(model_path, scaler, forest=None):
+    """
+    Compiles the IsolationForest at `model_path` in memory. Returns the compiled
+    forest and the arrays saved alongside it (the MinMax scaler's affine parameters).
+    """
+    import joblib
+
+    forest = forest if forest is not None else joblib.load(model_path)
+    params = {
+        "scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "min": np.asarray(scaler.min_, dtype=np.float64),
+        "clip": np.asarray(bool(getattr(scaler, "clip", False))),
+        "feature_range": np.asarray(scaler.feature_range, dtype=np.float64),
+        "feature_names": np.asarray(getattr(scaler, "feature_names_in_", []), dtype=str),
+        "source_mtime": np.asarray(os.path.getmtime(model_path)),
+    }
+    return CompiledForest.from_sklearn(forest), params
+
+
+def compile_model(model_path, scaler, forest=None):
+    """
+    Compiles the IsolationForest at `model_path` and saves it, together with the
+    MinMax scaler's affine parameters, next to it. Returns the compiled forest.
+    """
+    compiled, params = build_compiled(model_path, scaler, forest)
+    compiled.save(compiled_path(model_path), **params)
+    return compiled
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # This model defines the features required for a single customer
 # Your frontend or another service would provide this data
@@ -21,4 +22,37 @@ class FraudScoreResponse(BaseModel):
     customer_id: str
     is_anomaly: bool
     anomaly_score: float
-    assessment: str
\ No newline at end of file
+    assessment: str
+
+# A customer in a bulk scoring request; without features, they come from the feature store
+class CustomerScoreRequest(BaseModel):
+    customer_id: str
+    features: Optional[CustomerFeatures] = None
+
+class CustomerBatchRequest(BaseModel):
+    customers: List[CustomerScoreRequest]
+
+class FraudBatchResponse(BaseModel):
+    results: List[FraudScoreResponse]
+
+
+# One invoice (or credit note) from the order service, as in the training data
+class InvoiceLine(BaseModel):
+    stock_code: str
+    quantity: int
+    unit_price: float
+
+class InvoiceEvent(BaseModel):
+    invoice_no: str
+    customer_id: str
+    invoice_date: datetime
+    lines: List[InvoiceLine]
+    # Defaults to the dataset convention: return invoice numbers start with "C"
+    is_return: Optional[bool] = None
+
+class InvoiceEventBatch(BaseModel):
+    events: List[InvoiceEvent]
+
+class IngestResponse(BaseModel):
+    ingested: int
+    skipped: int
@@ -1,7 +1,9 @@
-import joblib
-import pandas as pd
+import numpy as np
+import operator
 import os
+import threading
 from pathlib import Path # Import Path
+from .compiled_forest import CompiledForest, build_compiled, compiled_path
 from .schemas import CustomerFeatures
 
 # --- Define paths using pathlib for robustness ---
@@ -27,19 +29,35 @@ SCALER_PATH = MODEL_DIR / "scaler.joblib" # Assuming this is the correct name
 
 # --- End of path definitions ---
 
+# The order of features MUST match the order used during training
+FEATURE_ORDER = [
+    'total_invoices', 'total_items', 'total_spend', 'distinct_products',
+    'days_as_customer', 'recency', 'total_items_returned', 'total_value_returned',
+    'total_return_invoices', 'return_rate_by_items', 'return_rate_by_value',
+    'return_rate_by_invoices'
+]
+
+
+# Reads every feature off a CustomerFeatures in FEATURE_ORDER with one C-level call
+_read_features = operator.attrgetter(*FEATURE_ORDER)
+
+
+def assess(is_anomaly: bool) -> str:
+    return "High risk of refund abuse" if is_anomaly else "Normal activity"
+
+
 class FraudScoringService:
     def __init__(self):
+        # A CompiledForest: same decision_function as the sklearn IsolationForest, without sklearn
         self.model = None
-        self.scaler = None
+        # MinMaxScaler.transform is X * scale_ + min_ (then clipped if the scaler clips);
+        # applied directly on NumPy arrays
+        self.scale = None
+        self.offset = None
+        self.clip_range = None
+        self._local = threading.local()
         try:
-            # Add checks for file existence before loading for clearer errors
-            if not MODEL_PATH.exists():
-                raise FileNotFoundError(f"Model file not found at: {MODEL_PATH}")
-            if not SCALER_PATH.exists():
-                raise FileNotFoundError(f"Scaler file not found at: {SCALER_PATH}")
-
-            self.model = joblib.load(MODEL_PATH)
-            self.scaler = joblib.load(SCALER_PATH)
+            self._load()
             print("Fraud detection model and scaler loaded successfully.")
         except FileNotFoundError as e:
             # This is the error message that gets caught and printed to your console
@@ -48,46 +66,103 @@ class FraudScoringService:
         except Exception as e:
             print(f"An unexpected error occurred during model/scaler loading: {e}")
             self.model = None
-            self.scaler = None
 
-    def score_customer(self, customer_id: str, features: CustomerFeatures) -> dict:
-        if not self.model or not self.scaler:
-            # This is the line that generates your "Fraud detection model is not available." detail
-            # when self.model or self.scaler is None due to FileNotFoundError or other loading error.
+    def _load(self):
+        compiled_file = compiled_path(MODEL_PATH)
+        compiled = None
+        if compiled_file.exists():
+            compiled, params = CompiledForest.load(compiled_file)
+            # A retrained joblib model makes the compiled copy stale
+            if MODEL_PATH.exists() and float(params["source_mtime"]) != os.path.getmtime(MODEL_PATH):
+                print("Compiled fraud model is older than the joblib model, recompiling.")
+                compiled = None
+
+        if compiled is None:
+            # Add checks for file existence before loading for clearer errors
+            if not MODEL_PATH.exists():
+                raise FileNotFoundError(f"Model file not found at: {MODEL_PATH}")
+            if not SCALER_PATH.exists():
+                raise FileNotFoundError(f"Scaler file not found at: {SCALER_PATH}")
+
+            import joblib
+            compiled, params = build_compiled(MODEL_PATH, joblib.load(SCALER_PATH))
+            # Only a cache for the next start: a read-only deploy still serves the in-memory forest
+            try:
+                compiled.save(compiled_file, **params)
+                print(f"Compiled fraud model saved to {compiled_file}")
+            except OSError as e:
+                print(f"Could not save the compiled fraud model ({e}); using it from memory.")
+
+        # We scale raw arrays, so the column order can no longer be checked by name per call
+        trained_order = [str(name) for name in params["feature_names"]] or FEATURE_ORDER
+        if trained_order != FEATURE_ORDER:
+            raise ValueError(f"Scaler was fitted on features {trained_order}, expected {FEATURE_ORDER}")
+
+        self.scale = params["scale"]
+        self.offset = params["min"]
+        self.clip_range = tuple(params["feature_range"]) if bool(params["clip"]) else None
+        self.model = compiled
+
+    def score_matrix(self, X: np.ndarray) -> np.ndarray:
+        """
+        Anomaly scores for a (n_customers, n_features) array in FEATURE_ORDER.
+        Negative scores are anomalies, exactly as IsolationForest.predict labels them.
+        """
+        if self.model is None:
             raise RuntimeError("Fraud detection model is not available.")
-            # return {
-            #     "customer_id": customer_id,
-            #     "error": "Model not loaded."
-            # } # You had this return, but the error indicates a RuntimeError is being raised instead.
-              # If your FastAPI endpoint handler catches this RuntimeError and converts it to a 503, that's fine.
-
-        # The order of features MUST match the order used during training
-        feature_order = [
-            'total_invoices', 'total_items', 'total_spend', 'distinct_products',
-            'days_as_customer', 'recency', 'total_items_returned', 'total_value_returned',
-            'total_return_invoices', 'return_rate_by_items', 'return_rate_by_value',
-            'return_rate_by_invoices'
-        ]
 
-        # Create a DataFrame from the input features with the correct order
-        data = {key: [getattr(features, key)] for key in feature_order}
-        df = pd.DataFrame(data)
+        X_scaled = X * self.scale + self.offset
+        if self.clip_range:
+            np.clip(X_scaled, *self.clip_range, out=X_scaled)
+        return self.model.decision_function(X_scaled)
+
+    def score_customers(self, customer_ids: list, features: list) -> list:
+        """
+        Scores many customers as a single array with one pass over the forest.
+        """
+        X = np.array([[getattr(f, key) for key in FEATURE_ORDER] for f in features], dtype=np.float64)
+        scores = self.score_matrix(X.reshape(len(features), len(FEATURE_ORDER)))
+
+        return [
+            {
+                "customer_id": customer_id,
+                "is_anomaly": bool(score < 0),
+                "anomaly_score": float(score),
+                "assessment": assess(bool(score < 0))
+            }
+            for customer_id, score in zip(customer_ids, scores)
+        ]
 
-        # Scale the features
-        X_scaled = self.scaler.transform(df)
+    def _row(self) -> np.ndarray:
+        # One preallocated (1, n_features) buffer per thread, reused for every request
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(FEATURE_ORDER)), dtype=np.float64)
+        return row
 
-        # Get the prediction and score
-        prediction = self.model.predict(X_scaled)[0] # -1 for anomaly, 1 for normal
-        score = self.model.decision_function(X_scaled)[0]
+    def score_customer(self, customer_id: str, features: CustomerFeatures) -> dict:
+        """
+        Low-latency path for a single customer: no DataFrame and no per-call
+        allocations beyond what the model itself does.
+        """
+        if self.model is None:
+            # This is the line that generates your "Fraud detection model is not available." detail
+            # when self.model is None due to FileNotFoundError or other loading error.
+            raise RuntimeError("Fraud detection model is not available.")
 
-        is_anomaly = bool(prediction == -1)
-        assessment = "High risk of refund abuse" if is_anomaly else "Normal activity"
+        row = self._row()
+        row[0] = _read_features(features)
+        row *= self.scale
+        row += self.offset
+        if self.clip_range:
+            np.clip(row, *self.clip_range, out=row)
+        score = float(self.model.decision_function(row)[0])
 
         return {
             "customer_id": customer_id,
-            "is_anomaly": is_anomaly,
-            "anomaly_score": float(score),
-            "assessment": assessment
+            "is_anomaly": score < 0,
+            "anomaly_score": score,
+            "assessment": assess(score < 0)
         }
 
 # Create a single instance to be used by the router
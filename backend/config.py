@@ -0,0 +1,90 @@
+# File: backend/config.py
+# Runtime settings shared by the backend modules.
+# Every value can be overridden through an environment variable of the same name.
+
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+# --- Model registry ---
+LOGO_MODEL_PATH = os.getenv("LOGO_MODEL_PATH", "assets/logo_classifier.pth")
+CLIP_MODEL_NAME = os.getenv("CLIP_MODEL_NAME", "ViT-B/32")
+# How often (seconds) a registered model checks its weights file for changes.
+MODEL_RELOAD_CHECK_INTERVAL = _env_float("MODEL_RELOAD_CHECK_INTERVAL", 5.0)
+
+# --- Micro-batching of model forward passes ---
+# A batch is run as soon as it holds BATCH_MAX_SIZE items or its first item
+# has waited BATCH_MAX_WAIT_MS milliseconds, whichever comes first.
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 16)
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 10.0)
+
+# --- Inference thread pool ---
+# Requests beyond INFERENCE_WORKERS running + INFERENCE_QUEUE_SIZE waiting get a 503.
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", 8)
+INFERENCE_QUEUE_SIZE = _env_int("INFERENCE_QUEUE_SIZE", 32)
+INFERENCE_RETRY_AFTER = _env_int("INFERENCE_RETRY_AFTER", 2)
+
+# --- Listing verdict store ---
+VERDICT_DB_PATH = os.getenv("VERDICT_DB_PATH", "data/listing_verdicts.db")
+# Legacy JSON logs, imported into the store the first time it is created
+FLAGGED_LOG = os.getenv("FLAGGED_LOG", "flagged_items.json")
+AUTHENTIC_LOG = os.getenv("AUTHENTIC_LOG", "authentic_items.json")
+
+# --- Image feature cache (keyed by the SHA-256 of the uploaded bytes) ---
+IMAGE_CACHE_SIZE = _env_int("IMAGE_CACHE_SIZE", 4096)
+# Optional on-disk tier; leave empty to keep the cache in memory only
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", "data/image_features.db")
+# Rows kept in the on-disk tier; the least recently used ones are evicted beyond this
+IMAGE_CACHE_DISK_MAX_ROWS = _env_int("IMAGE_CACHE_DISK_MAX_ROWS", 200000)
+
+# --- CLIP text side ---
+TEXT_CACHE_SIZE = _env_int("TEXT_CACHE_SIZE", 8192)
+# Pre-encoded "a photo of a <brand> logo" prompts for every brand in BRAND_LABELS
+BRAND_PROMPT_BANK_PATH = os.getenv("BRAND_PROMPT_BANK_PATH", "assets/brand_prompt_embeddings.pt")
+
+# --- Bulk ingestion ---
+# Listings of one bulk request in flight at once (they share the inference pool and batchers)
+BULK_CONCURRENCY = _env_int("BULK_CONCURRENCY", 16)
+# Verdicts are written to the store in groups of this size
+BULK_FLUSH_SIZE = _env_int("BULK_FLUSH_SIZE", 200)
+# Times a listing waits for a free inference slot before it is reported as an error
+BULK_MAX_POOL_RETRIES = _env_int("BULK_MAX_POOL_RETRIES", 30)
+
+# --- Background job queue ---
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.db")
+# Uploaded inputs of queued jobs are kept here until the job finishes
+JOB_INPUT_DIR = os.getenv("JOB_INPUT_DIR", "data/job_inputs")
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)
+JOB_MAX_ATTEMPTS = _env_int("JOB_MAX_ATTEMPTS", 3)
+# A running job whose worker stops renewing its lease for this long is re-queued
+JOB_LEASE_SECONDS = _env_float("JOB_LEASE_SECONDS", 60.0)
+# Delay before the first retry of a failed attempt; doubles with every further attempt
+JOB_RETRY_BACKOFF_SECONDS = _env_float("JOB_RETRY_BACKOFF_SECONDS", 5.0)
+# Longest a client may long-poll GET /jobs/{id}
+JOB_MAX_WAIT_SECONDS = _env_float("JOB_MAX_WAIT_SECONDS", 30.0)
+
+# --- Online review scoring ---
+REVIEW_SENTIMENT_MODEL = os.getenv("REVIEW_SENTIMENT_MODEL", "cardiffnlp/twitter-roberta-base-sentiment")
+REVIEW_MAX_BATCH = _env_int("REVIEW_MAX_BATCH", 256)
+
+# --- Post-purchase fraud scoring ---
+FRAUD_MAX_BATCH = _env_int("FRAUD_MAX_BATCH", 50000)
+# Per-customer aggregates built from invoice/return events
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "data/customer_features.db")
+# HyperLogLog precision for distinct products: 2**p one-byte registers per customer
+HLL_PRECISION = _env_int("HLL_PRECISION", 10)
+
+# --- CPU inference backend ---
+# "torch" (eager fp32), "quantized" (dynamic int8 Linear layers) or "onnx" (ONNX Runtime)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_DIR = os.getenv("ONNX_DIR", "assets/onnx")
+# Max relative error vs the fp32 outputs a backend may show before we fall back to fp32
+# (empty = per-backend default)
+BACKEND_TOLERANCE = os.getenv("BACKEND_TOLERANCE", "")
@@ -6,12 +6,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # --- 1. Import all your routers ---
 # These are in the local 'backend/routers/' folder
-from routers import ingestion, metrics, admin, detect 
+from routers import ingestion, metrics, admin, detect, jobs
 
 # These are in their own feature modules
 from Post_Purchase.routers import fraud_router
 from Fake_Review_Detection.routers import review_router
 
+from models.registry import registry
+
 # --- 2. Initialize the FastAPI App ---
 app = FastAPI(
     title="BYTEME Hackathon Project",
@@ -38,6 +40,7 @@ app.include_router(admin.router, prefix="/api/v1", tags=["Admin"]) # e.g., /api/
 # Core feature routers
 app.include_router(ingestion.router, prefix="/api/v1", tags=["Ingestion"]) # e.g., /api/v1/ingest/upload_listing/
 app.include_router(detect.router, prefix="/api/v1", tags=["Detection"]) # e.g., /api/v1/detect/counterfeit/
+app.include_router(jobs.router, prefix="/api/v1", tags=["Jobs"]) # e.g., /api/v1/jobs/upload_listing/
 
 # Other feature-specific routers
 app.include_router(fraud_router.router, prefix="/api/v1")
@@ -57,7 +60,23 @@ app.include_router(admin.router)
 
 
 
-# --- 5. Define a root endpoint for a simple health check ---
+# --- 5. Load the models before the first request arrives ---
+@app.on_event("startup")
+def warmup_models():
+    try:
+        registry.warmup()
+    except Exception as e:
+        # The models are loaded again on first use, so a failed warmup is not fatal
+        print(f"[ERROR] Model warmup failed: {e}")
+
+
+# Start the background job workers (re-queues jobs left running by a crash)
+@app.on_event("startup")
+def start_job_workers():
+    jobs.job_queue.start()
+
+
+# --- 6. Define a root endpoint for a simple health check ---
 @app.get("/")
 def read_root():
     return {"message": "Trust & Safety API is running"}
\ No newline at end of file
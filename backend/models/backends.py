@@ -0,0 +1,116 @@
+import copy
+import os
+
+import torch
+
+from config import INFERENCE_BACKEND, ONNX_DIR, BACKEND_TOLERANCE
+
+BACKENDS = ("torch", "quantized", "onnx")
+
+# Relative tolerance (max abs error / max abs fp32 output). int8 weights drift
+# further from fp32 than an ONNX graph of the same fp32 weights.
+DEFAULT_TOLERANCE = {"quantized": 0.05, "onnx": 1e-4}
+
+
+class Forward(torch.nn.Module):
+    """
+    Exposes one method of a model (e.g. CLIP's `encode_image`) as `forward`,
+    optionally picking one field of its output (e.g. `logits`), so it can be
+    quantized or exported like any other module.
+    """
+
+    def __init__(self, model, method="forward", output_attr=None):
+        super().__init__()
+        self.model = model
+        self.method = method
+        self.output_attr = output_attr
+
+    def forward(self, *inputs):
+        output = getattr(self.model, self.method)(*inputs)
+        return getattr(output, self.output_attr) if self.output_attr else output
+
+
+class OnnxModule:
+    """
+    Runs an exported ONNX graph with ONNX Runtime on CPU, taking and returning torch tensors.
+    """
+
+    def __init__(self, path):
+        import onnxruntime  # optional dependency, only needed for INFERENCE_BACKEND=onnx
+
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, *inputs):
+        feeds = {name: tensor.detach().cpu().numpy() for name, tensor in zip(self.input_names, inputs)}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+def quantize(module):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized on the fly)."""
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(module), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(module, example_inputs, path, input_names):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Per-process temp name: several workers may export the same model at once
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            module, example_inputs, tmp_path,
+            input_names=input_names, output_names=["output"],
+            # Every input and the output may vary along the batch (and sequence) dims
+            dynamic_axes={
+                **{name: {0: "batch", **({1: "sequence"} if example.dim() == 2 else {})}
+                   for name, example in zip(input_names, example_inputs)},
+                "output": {0: "batch"},
+            },
+            opset_version=17,
+        )
+    os.replace(tmp_path, path)
+
+
+def relative_error(reference, candidate, example_inputs):
+    with torch.no_grad():
+        expected = reference(*example_inputs).float()
+        actual = candidate(*example_inputs).float()
+    return ((expected - actual).abs().max() / expected.abs().max().clamp_min(1e-12)).item()
+
+
+def build_backend(name, module, example_inputs, input_names, backend=INFERENCE_BACKEND, version="",
+                  onnx_dir=ONNX_DIR, tolerance=None):
+    """
+    Returns a callable equivalent to `module` running on the requested CPU backend.
+
+    The candidate is checked against the fp32 module on `example_inputs`; if it is
+    further than the tolerance from the fp32 outputs (or cannot be built) the fp32
+    module is returned instead, so a bad export never changes verdicts.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if backend == "torch":
+        return module
+
+    if tolerance is None:
+        tolerance = float(BACKEND_TOLERANCE) if BACKEND_TOLERANCE else DEFAULT_TOLERANCE[backend]
+    try:
+        if backend == "quantized":
+            candidate = quantize(module)
+        else:
+            # Exported graphs are keyed by model version so new weights get a fresh export
+            path = os.path.join(onnx_dir, f"{name}{'-' + str(version) if version else ''}.onnx")
+            if not os.path.exists(path):
+                export_onnx(module, example_inputs, path, input_names)
+            candidate = OnnxModule(path)
+
+        error = relative_error(module, candidate, example_inputs)
+    except Exception as e:
+        print(f"[ERROR] Building {backend} backend for '{name}' failed, using fp32: {e}")
+        return module
+
+    if error > tolerance:
+        print(f"[ERROR] {backend} backend for '{name}' differs from fp32 by {error:.4g} (> {tolerance}), using fp32.")
+        return module
+    print(f"Model '{name}' running on {backend} backend (relative error vs fp32: {error:.4g}).")
+    return candidate
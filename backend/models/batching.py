@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+# name -> MicroBatcher, used by the metrics endpoint
+BATCHERS = {}
+
+
+class MicroBatcher:
+    """
+    Collects single-item requests from many threads and runs them as one batch.
+
+    `batch_fn` receives a list of items and must return a list of results in the
+    same order. Each caller gets its own result back through a Future.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items_processed = 0
+        BATCHERS[name] = self
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def stats(self):
+        with self._stats_lock:
+            sizes = dict(self._batch_sizes)
+            items = self._items_processed
+        batches = sum(sizes.values())
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(sizes.items())},
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                # Every caller must be released, or it would wait on its Future forever
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._items_processed += len(batch)
+
+
+def batching_stats():
+    return {name: batcher.stats() for name, batcher in BATCHERS.items()}
@@ -1,40 +1,146 @@
+import hashlib
+import os
+
 import clip
 import torch
-from PIL import Image
 
-from models.logo_classifier import predict_brand_logo
+from config import CLIP_MODEL_NAME, INFERENCE_BACKEND, TEXT_CACHE_SIZE, BRAND_PROMPT_BANK_PATH
+from models.backends import Forward, build_backend
+from models.batching import MicroBatcher
+from models.feature_cache import ImageFeatures, LRUCache, image_feature_cache
+from models.logo_classifier import BRAND_LABELS, predict_brand_logo
+from models.preprocessing import PreparedImage, prepare_image
+from models.registry import registry
 
-# 📦 Load CLIP once at startup
+# 📦 Load CLIP once (at startup warmup or on first use)
 _device = "cuda" if torch.cuda.is_available() else "cpu"
-_model, _preprocess = clip.load("ViT-B/32", device=_device)
 
-# 🔍 Compute CLIP image-text similarity
-def compute_image_text_similarity(image_path: str, text: str) -> float:
-    try:
-        image = _preprocess(Image.open(image_path)).unsqueeze(0).to(_device)
-        text_tokens = clip.tokenize([text]).to(_device)
+def load_clip():
+    model, preprocess = clip.load(CLIP_MODEL_NAME, device=_device)
+    image_encoder, text_encoder = Forward(model, "encode_image"), Forward(model, "encode_text")
+    if _device == "cpu":
+        # ⚡ Optional int8 / ONNX Runtime backends for each tower, checked against fp32
+        version = CLIP_MODEL_NAME.replace("/", "-")
+        example_image = torch.rand(2, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+        example_tokens = clip.tokenize(["a photo of a nike logo", "samsung galaxy phone - brand new"])
+        image_encoder = build_backend("clip_image", image_encoder, (example_image,), ["image"], version=version)
+        text_encoder = build_backend("clip_text", text_encoder, (example_tokens,), ["tokens"], version=version)
+    return image_encoder, text_encoder, preprocess
+
+registry.register("clip", load_clip)
+
+# 🧮 Batched CLIP encoders: concurrent requests share one forward pass
+def _encode_images(images):
+    image_encoder, _, _ = registry.get("clip")
+    batch = torch.stack(images).to(_device)
+    with torch.no_grad():
+        features = image_encoder(batch)
+    features /= features.norm(dim=-1, keepdim=True)
+    return list(features.cpu())
+
+
+def _encode_texts(texts):
+    _, text_encoder, _ = registry.get("clip")
+    # truncate so one over-long title cannot fail the whole batch
+    tokens = clip.tokenize(texts, truncate=True).to(_device)
+    with torch.no_grad():
+        features = text_encoder(tokens)
+    features /= features.norm(dim=-1, keepdim=True)
+    return list(features.cpu())
+
+
+_image_encoder = MicroBatcher("clip_image", _encode_images)
+_text_encoder = MicroBatcher("clip_text", _encode_texts)
+
+# 📝 Titles and descriptions repeat a lot across a catalog, so keep their embeddings
+text_embedding_cache = LRUCache(TEXT_CACHE_SIZE)
+
+def encode_text(text: str) -> torch.Tensor:
+    # CLIP lower-cases and collapses whitespace itself, so these all encode identically
+    key = " ".join(text.lower().split())
+    embedding = text_embedding_cache.get(key)
+    if embedding is None:
+        embedding = _text_encoder(key)
+        text_embedding_cache.put(key, embedding)
+    return embedding
+
+# 🏷️ Pre-encoded brand prompts: brand checks become one matrix multiply
+BRAND_PROMPTS = [f"a photo of a {brand.replace('_', ' ')} logo" for brand in BRAND_LABELS]
 
-        with torch.no_grad():
-            image_features = _model.encode_image(image)
-            text_features = _model.encode_text(text_tokens)
+def load_brand_prompt_bank() -> torch.Tensor:
+    if os.path.exists(BRAND_PROMPT_BANK_PATH):
+        saved = torch.load(BRAND_PROMPT_BANK_PATH, map_location="cpu")
+        if saved.get("model") == CLIP_MODEL_NAME and saved.get("prompts") == BRAND_PROMPTS:
+            return saved["embeddings"]
 
-        image_features /= image_features.norm(dim=-1, keepdim=True)
-        text_features /= text_features.norm(dim=-1, keepdim=True)
+    # Missing or built for another model / label set: encode once and persist
+    embeddings = torch.stack(_encode_texts(BRAND_PROMPTS)).float()
+    if os.path.dirname(BRAND_PROMPT_BANK_PATH):
+        os.makedirs(os.path.dirname(BRAND_PROMPT_BANK_PATH), exist_ok=True)
+    torch.save({"model": CLIP_MODEL_NAME, "prompts": BRAND_PROMPTS, "embeddings": embeddings}, BRAND_PROMPT_BANK_PATH)
+    return embeddings
 
-        similarity = (image_features @ text_features.T).item()
+registry.register("clip_brand_prompts", load_brand_prompt_bank)
+
+def clip_brand_scores(image: ImageFeatures) -> dict:
+    if image.embedding is None:
+        return {}
+    bank = registry.get("clip_brand_prompts")
+    # Same logit scale CLIP uses for zero-shot classification
+    probs = (100.0 * bank @ image.embedding.float()).softmax(dim=0)
+    return {brand: round(score, 3) for brand, score in zip(BRAND_LABELS, probs.tolist())}
+
+# 🖼️ Decode the uploaded bytes once into the inputs of both models
+def prepare_listing_image(data: bytes) -> PreparedImage:
+    _, _, _preprocess = registry.get("clip")
+    return prepare_image(data, _preprocess)
+
+# ♻️ Image-side model outputs, reused for any listing that uploads the same bytes
+def extract_image_features(data: bytes) -> ImageFeatures:
+    # Include the logo weights version so a hot-reloaded model never serves stale predictions,
+    # and the CPU backend so switching fp32 / int8 / ONNX does not reuse the other's embeddings
+    backend = INFERENCE_BACKEND if _device == "cpu" else _device
+    key = f"{hashlib.sha256(data).hexdigest()}:{CLIP_MODEL_NAME}:{backend}:{registry.version('logo_classifier')}"
+    cached = image_feature_cache.get(key)
+    if cached is not None:
+        return cached
+
+    prepared = prepare_listing_image(data)
+    embedding_future = _image_encoder.submit(prepared.clip_tensor)
+    logo_prediction = predict_brand_logo(prepared.logo_tensor)
+    try:
+        embedding = embedding_future.result()
+    except Exception as e:
+        print(f"[ERROR] CLIP Image Encoding Failed: {e}")
+        return ImageFeatures(None, logo_prediction)
+
+    features = ImageFeatures(embedding, logo_prediction)
+    image_feature_cache.put(key, features)
+    return features
+
+# 🔍 Compute CLIP image-text similarity
+def compute_image_text_similarity(image: ImageFeatures, text: str) -> float:
+    if image.embedding is None:
+        return 0.0
+    try:
+        text_features = encode_text(text)
+        # Embeddings read back from the disk cache are float32 on the CPU
+        embedding = image.embedding.to(device=text_features.device, dtype=text_features.dtype)
+        similarity = (embedding @ text_features).item()
         return round(similarity, 3)
     except Exception as e:
         print(f"[ERROR] CLIP Similarity Failed: {e}")
         return 0.0
 
 # 🧠 Logo prediction and brand matching
-def compute_logo_flags(image_path: str, claimed_brand: str) -> dict:
-    result = predict_brand_logo(image_path)
+def compute_logo_flags(image: ImageFeatures, claimed_brand: str) -> dict:
+    result = image.logo_prediction
 
     claimed_brand = claimed_brand.strip().lower()
     predicted_brand = result["predicted_brand"]
     confidence = result["confidence"]
     top_3 = result["top_3_predictions"]
+    clip_scores = clip_brand_scores(image)
 
     brand_mismatch = predicted_brand != claimed_brand and predicted_brand != "unknown"
 
@@ -43,5 +149,6 @@ def compute_logo_flags(image_path: str, claimed_brand: str) -> dict:
         "brand_confidence": confidence,
         "top_3_brand_guesses": top_3,
         "claimed_brand": claimed_brand,
-        "brand_mismatch": brand_mismatch
+        "brand_mismatch": brand_mismatch,
+        "clip_brand_guess": max(clip_scores, key=clip_scores.get) if clip_scores else None
     }
@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import torch
+
+from config import IMAGE_CACHE_SIZE, IMAGE_CACHE_PATH, IMAGE_CACHE_DISK_MAX_ROWS
+
+
+class ImageFeatures(NamedTuple):
+    # L2-normalised CLIP image embedding (None if CLIP failed on this image)
+    embedding: Optional[torch.Tensor]
+    # Output of models.logo_classifier.predict_brand_logo
+    logo_prediction: dict
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used entry.
+    """
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class ImageFeatureCache:
+    """
+    Caches the model outputs for an image, keyed by a hash of its bytes.
+
+    Lookups go to an in-memory LRU first and then, if `path` is set, to an SQLite
+    table that survives restarts. Disk hits are promoted back into memory. The
+    table is capped at `max_disk_rows`, evicting the least recently used rows;
+    memory hits count as uses too (their disk timestamps are refreshed in one
+    batch just before each eviction).
+    """
+
+    # Eviction runs once per this many disk writes, so the table may briefly overshoot
+    EVICT_EVERY = 64
+
+    def __init__(self, max_items=IMAGE_CACHE_SIZE, path=IMAGE_CACHE_PATH, max_disk_rows=IMAGE_CACHE_DISK_MAX_ROWS):
+        self.memory = LRUCache(max_items)
+        self.path = path or None
+        self.max_disk_rows = max_disk_rows
+        self.disk_hits = 0
+        self._writes = 0
+        # Keys served from memory since the last eviction -> time of their latest hit
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._local = threading.local()
+        if self.path:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS image_features ("
+                    "key TEXT PRIMARY KEY, embedding BLOB, logo_prediction TEXT NOT NULL, "
+                    "accessed_at REAL NOT NULL DEFAULT 0)"
+                )
+                # Tables created before the disk tier was capped
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(image_features)")}
+                if "accessed_at" not in columns:
+                    conn.execute("ALTER TABLE image_features ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_image_features_accessed ON image_features (accessed_at)"
+                )
+            self._evict(conn)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        features = self.memory.get(key)
+        if features is not None and self.path:
+            with self._touched_lock:
+                self._touched[key] = time.time()
+        if features is not None or not self.path:
+            return features
+
+        row = self._conn().execute(
+            "SELECT embedding, logo_prediction FROM image_features WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE image_features SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        embedding = torch.frombuffer(bytearray(row[0]), dtype=torch.float32) if row[0] else None
+        features = ImageFeatures(embedding, json.loads(row[1]))
+        self.memory.put(key, features)
+        self.disk_hits += 1
+        return features
+
+    def put(self, key, features):
+        self.memory.put(key, features)
+        if not self.path:
+            return
+        embedding = features.embedding.float().numpy().tobytes() if features.embedding is not None else None
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO image_features (key, embedding, logo_prediction, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, embedding, json.dumps(features.logo_prediction), time.time())
+            )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if self.max_disk_rows <= 0:
+            return
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        with conn:
+            conn.executemany(
+                "UPDATE image_features SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(when, key) for key, when in touched.items()]
+            )
+            conn.execute(
+                "DELETE FROM image_features WHERE key IN ("
+                "SELECT key FROM image_features ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_rows,)
+            )
+
+    def stats(self):
+        return {**self.memory.stats(), "disk_tier": bool(self.path), "disk_hits": self.disk_hits}
+
+
+# Create a single instance shared by all routers
+image_feature_cache = ImageFeatureCache()
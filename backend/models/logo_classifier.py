@@ -1,8 +1,14 @@
+import os
+
 import torch
-from torchvision import models, transforms
-from PIL import Image
+from torchvision import models
 import torch.nn.functional as F
 
+from config import LOGO_MODEL_PATH
+from models.backends import build_backend
+from models.batching import MicroBatcher
+from models.registry import registry
+
 # ✅ Match training brand label order
 BRAND_LABELS = [
     "nike", "adidas", "puma", "apple", "samsung", "hp", "levis",
@@ -13,39 +19,47 @@ BRAND_LABELS = [
 def load_logo_model():
     model = models.resnet18(weights=None)
     model.fc = torch.nn.Linear(model.fc.in_features, len(BRAND_LABELS))
-    model.load_state_dict(torch.load("assets/logo_classifier.pth", map_location=torch.device('cpu')))
+    model.load_state_dict(torch.load(LOGO_MODEL_PATH, map_location=torch.device('cpu')))
     model.eval()
-    return model
-
-# 🔍 Predict logo brand with top-3 probabilities
-def predict_brand_logo(image_path):
-    model = load_logo_model()
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor()
-    ])
+    # ⚡ Optional int8 / ONNX Runtime backend, checked against these fp32 weights
+    example = torch.rand(2, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+    return build_backend(
+        "logo_classifier", model, (example,), input_names=["image"],
+        version=int(os.path.getmtime(LOGO_MODEL_PATH))
+    )
 
-    img = Image.open(image_path).convert("RGB")
-    img_tensor = transform(img).unsqueeze(0)
+# 📦 Shared across requests, reloaded when the weights file changes
+registry.register("logo_classifier", load_logo_model, path=LOGO_MODEL_PATH)
 
+# 🧮 Batched forward pass: concurrent requests share one ResNet call
+def _classify_logos(images):
+    model = registry.get("logo_classifier")
     with torch.no_grad():
-        output = model(img_tensor)
-        probs = F.softmax(output, dim=1).squeeze()
+        probs = F.softmax(model(torch.stack(images)), dim=1)
+    return list(probs)
+
+
+_logo_classifier = MicroBatcher("logo_classifier", _classify_logos)
+
+# 🔍 Predict logo brand with top-3 probabilities
+# `image_tensor` is the 3x224x224 output of models.preprocessing.LOGO_TRANSFORM
+def predict_brand_logo(image_tensor):
+    probs = _logo_classifier(image_tensor)
 
-        top_probs, top_indices = torch.topk(probs, k=3)
-        top_brands = [BRAND_LABELS[i] for i in top_indices.tolist()]
-        top_scores = top_probs.tolist()
+    top_probs, top_indices = torch.topk(probs, k=3)
+    top_brands = [BRAND_LABELS[i] for i in top_indices.tolist()]
+    top_scores = top_probs.tolist()
 
-        predicted_brand = top_brands[0]
-        confidence = top_scores[0]
+    predicted_brand = top_brands[0]
+    confidence = top_scores[0]
 
-        if confidence < 0.6:
-            predicted_brand = "unknown"
+    if confidence < 0.6:
+        predicted_brand = "unknown"
 
-        return {
-            "predicted_brand": predicted_brand,
-            "confidence": round(confidence, 3),
-            "top_3_predictions": {
-                brand: round(score, 3) for brand, score in zip(top_brands, top_scores)
-            }
+    return {
+        "predicted_brand": predicted_brand,
+        "confidence": round(confidence, 3),
+        "top_3_predictions": {
+            brand: round(score, 3) for brand, score in zip(top_brands, top_scores)
         }
+    }
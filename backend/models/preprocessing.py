@@ -0,0 +1,51 @@
+import io
+from typing import NamedTuple
+
+import torch
+from PIL import Image, UnidentifiedImageError
+from torchvision import transforms
+
+# Both models look at the image at 224x224
+MODEL_INPUT_SIZE = 224
+
+# 🖼️ Logo classifier input: plain 224x224 resize, same as training
+LOGO_TRANSFORM = transforms.Compose([
+    transforms.Resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)),
+    transforms.ToTensor()
+])
+
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes cannot be decoded as an image."""
+
+
+class PreparedImage(NamedTuple):
+    clip_tensor: torch.Tensor
+    logo_tensor: torch.Tensor
+
+
+def decode_image(data: bytes, min_size: int = MODEL_INPUT_SIZE) -> Image.Image:
+    """
+    Decode uploaded image bytes at the lowest resolution that still covers `min_size`.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG: let libjpeg decode straight to 1/2, 1/4 or 1/8 scale instead of full size
+        img.draft("RGB", (min_size, min_size))
+        img = img.convert("RGB")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImageDecodeError(str(e)) from e
+
+    # Other formats: cheap box reduction, keeping 2x headroom for the final antialiased resize
+    factor = min(img.size) // (2 * min_size)
+    if factor > 1:
+        img = img.reduce(factor)
+    return img
+
+
+def prepare_image(data: bytes, clip_preprocess) -> PreparedImage:
+    """
+    Decode once and build the inputs for both CLIP and the logo classifier.
+    """
+    img = decode_image(data)
+    return PreparedImage(clip_tensor=clip_preprocess(img), logo_tensor=LOGO_TRANSFORM(img))
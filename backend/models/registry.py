@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+from config import MODEL_RELOAD_CHECK_INTERVAL
+
+
+class _ModelEntry:
+    def __init__(self, name, loader, path):
+        self.name = name
+        self.loader = loader
+        self.path = path
+        self.model = None
+        self.mtime = None
+        self.loaded_at = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Keeps one shared instance of every model in the process.
+
+    Models are loaded on first use (or ahead of traffic via `warmup`) and, when
+    registered with a weights `path`, reloaded in place as soon as that file changes.
+    """
+
+    def __init__(self, check_interval=MODEL_RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries = {}
+
+    def register(self, name, loader, path=None):
+        self._entries[name] = _ModelEntry(name, loader, path)
+
+    def get(self, name):
+        entry = self._entries[name]
+        if entry.model is None or self._weights_changed(entry):
+            self._load(entry)
+        return entry.model
+
+    def version(self, name):
+        """
+        Identifies the weights currently served for `name` (the weights file mtime),
+        so cached model outputs can be keyed by the model that produced them.
+        """
+        self.get(name)
+        return self._entries[name].mtime
+
+    def warmup(self, names=None):
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def reload(self, name):
+        self._load(self._entries[name], force=True)
+        return self._entries[name].model
+
+    def status(self):
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "path": entry.path,
+                "loaded_at": entry.loaded_at,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def _weights_changed(self, entry):
+        if entry.path is None:
+            return False
+        now = time.monotonic()
+        if now - entry.last_check < self.check_interval:
+            return False
+        entry.last_check = now
+        try:
+            return os.path.getmtime(entry.path) != entry.mtime
+        except OSError:
+            return False
+
+    def _load(self, entry, force=False):
+        with entry.lock:
+            # Another request may have finished the load while we waited for the lock
+            if entry.model is not None and not force and not self._stale(entry):
+                return
+            mtime = os.path.getmtime(entry.path) if entry.path and os.path.exists(entry.path) else None
+            try:
+                model = entry.loader()
+            except Exception as e:
+                if entry.model is None:
+                    raise
+                # Keep serving the previous weights if the new file is broken or half-written
+                print(f"[ERROR] Reloading model '{entry.name}' failed, keeping previous version: {e}")
+                entry.mtime = mtime
+                return
+            # Swap the reference in one step: in-flight requests keep the old object
+            entry.model = model
+            entry.mtime = mtime
+            entry.loaded_at = time.time()
+            print(f"Model '{entry.name}' loaded.")
+
+    def _stale(self, entry):
+        if entry.path is None:
+            return False
+        try:
+            return os.path.getmtime(entry.path) != entry.mtime
+        except OSError:
+            return False
+
+
+# Create a single instance shared by all routers
+registry = ModelRegistry()
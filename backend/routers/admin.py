@@ -1,20 +1,43 @@
-from fastapi import APIRouter, HTTPException
-import os
-import json
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+
+from models.registry import registry
+from utils.verdict_store import verdict_store
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
-FLAGGED_LOG = "flagged_items.json"
 
 @router.get("/flagged/")
-async def get_flagged_listings():
-    if not os.path.exists(FLAGGED_LOG):
-        raise HTTPException(status_code=404, detail="No flagged listings found.")
-
-    with open(FLAGGED_LOG, "r") as f:
-        data = json.load(f)
+def get_flagged_listings(
+    seller_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    filters = dict(
+        status="flagged", seller_id=seller_id, product_id=product_id,
+        brand=brand, since=since, until=until
+    )
+    data = verdict_store.query(**filters, limit=limit, offset=offset)
 
-    if not data:
+    if not data and offset == 0:
         return {"message": "No flagged listings yet."}
-    
-    return {"flagged_listings": data}
+
+    return {"flagged_listings": data, "total": verdict_store.count(**filters), "limit": limit, "offset": offset}
+
+
+@router.get("/models/")
+def get_model_status():
+    return registry.status()
+
+
+@router.post("/models/{name}/reload")
+def reload_model(name: str):
+    if name not in registry.status():
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'.")
+    registry.reload(name)
+    return {"message": f"Model '{name}' reloaded", "status": registry.status()[name]}
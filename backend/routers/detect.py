@@ -1,41 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 import os
-import shutil
 from uuid import uuid4
 
 from models.counterfeit_detector import (
     compute_image_text_similarity,
-    compute_logo_flags  # ✅ updated to OCR-free function
+    compute_logo_flags,  # ✅ updated to OCR-free function
+    extract_image_features
 )
+from models.preprocessing import ImageDecodeError
+from utils.inference_pool import inference_pool
 
 router = APIRouter(prefix="/detect", tags=["Detection"])
 
-UPLOAD_DIR = "uploads"
 EVIDENCE_DIR = "evidence"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(EVIDENCE_DIR, exist_ok=True)
 
-@router.post("/counterfeit/")
-async def detect_counterfeit(
-    image: UploadFile = File(...),
-    title: str = Form(...),
-    description: str = Form(...)
-):
-    ext = image.filename.split('.')[-1]
-    filename = f"{uuid4()}.{ext}"
-    temp_path = os.path.join(UPLOAD_DIR, filename)
-
-    with open(temp_path, "wb") as f:
-        shutil.copyfileobj(image.file, f)
+# 🧠 Blocking part of the check: decode + model inference (runs on the inference pool)
+def _run_counterfeit_check(data, ext, title, description):
+    # 🖼️ Image-side inference, skipped entirely for bytes we have already seen
+    try:
+        image_features = extract_image_features(data)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode uploaded image: {e}")
 
     # 🧠 Combine title and description for CLIP
     full_text = f"{title.strip()} - {description.strip()}"
 
     # 1️⃣ CLIP score
-    similarity_score = compute_image_text_similarity(temp_path, full_text)
+    similarity_score = compute_image_text_similarity(image_features, full_text)
 
     # 2️⃣ Logo-based brand check
-    flag_info = compute_logo_flags(temp_path, title)
+    flag_info = compute_logo_flags(image_features, title)
 
     # 🚩 Flag if any detection fails
     suspected_counterfeit = (
@@ -43,12 +38,12 @@ async def detect_counterfeit(
         flag_info["brand_mismatch"]
     )
 
+    # 💾 Only suspicious images are kept on disk as evidence
     if suspected_counterfeit:
-        final_path = os.path.join(EVIDENCE_DIR, filename)
-        shutil.move(temp_path, final_path)
-        image_path = final_path
+        image_path = os.path.join(EVIDENCE_DIR, f"{uuid4()}.{ext}")
+        with open(image_path, "wb") as f:
+            f.write(data)
     else:
-        os.remove(temp_path)
         image_path = None
 
     return {
@@ -61,5 +56,17 @@ async def detect_counterfeit(
         "claimed_brand": flag_info["claimed_brand"],
         "brand_confidence": flag_info["brand_confidence"],
         "top_3_brand_guesses": flag_info["top_3_brand_guesses"],
-        "brand_mismatch": flag_info["brand_mismatch"]
+        "brand_mismatch": flag_info["brand_mismatch"],
+        "clip_brand_guess": flag_info["clip_brand_guess"]
     }
+
+
+@router.post("/counterfeit/")
+async def detect_counterfeit(
+    image: UploadFile = File(...),
+    title: str = Form(...),
+    description: str = Form(...)
+):
+    ext = image.filename.split('.')[-1]
+    data = await image.read()
+    return await inference_pool.run(_run_counterfeit_check, data, ext, title, description)
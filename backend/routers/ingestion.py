@@ -1,29 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, Form
-import shutil
-import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
 import json
+import os
+import shutil
+import tempfile
+from typing import List, Optional
 from uuid import uuid4
 from datetime import datetime
 
 from models.counterfeit_detector import (
     compute_image_text_similarity,
-    compute_logo_flags
+    compute_logo_flags,
+    extract_image_features
 )
+from models.preprocessing import ImageDecodeError
+from config import BULK_CONCURRENCY, BULK_FLUSH_SIZE, BULK_MAX_POOL_RETRIES
+from utils.bulk_upload import MANIFEST_FIELDS, ListingImages, parse_manifest
+from utils.inference_pool import inference_pool
+from utils.verdict_store import verdict_store
 
 router = APIRouter(prefix="/ingest", tags=["Ingestion"])
 
-UPLOAD_DIR = "uploads/"
 EVIDENCE_DIR = "evidence/"
-FLAGGED_LOG = "flagged_items.json"
-AUTHENTIC_LOG = "authentic_items.json"
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(EVIDENCE_DIR, exist_ok=True)
 
 
-# 📄 Log flagged listings
-def log_flagged_product(product_id, seller_id, score, image_path, title, description, flags):
-    flagged_item = {
+# 📄 Flagged listing record
+def build_flagged_record(product_id, seller_id, score, image_path, title, description, flags):
+    return {
         "product_id": product_id,
         "seller_id": seller_id,
         "similarity_score": score,
@@ -38,58 +45,31 @@ def log_flagged_product(product_id, seller_id, score, image_path, title, descrip
         "timestamp": datetime.now().isoformat()
     }
 
-    data = []
-    if os.path.exists(FLAGGED_LOG):
-        with open(FLAGGED_LOG, "r") as f:
-            data = json.load(f)
-
-    data.append(flagged_item)
-
-    with open(FLAGGED_LOG, "w") as f:
-        json.dump(data, f, indent=2)
-
 
-# ✅ Log authentic listings
-def log_authentic_product(product_id, seller_id, title, description):
-    item = {
+# ✅ Authentic listing record
+def build_authentic_record(product_id, seller_id, title, description, claimed_brand=None):
+    return {
         "product_id": product_id,
         "seller_id": seller_id,
+        "claimed_brand": claimed_brand,
         "title": title,
         "description": description,
         "status": "authentic",
         "timestamp": datetime.now().isoformat()
     }
 
-    data = []
-    if os.path.exists(AUTHENTIC_LOG):
-        with open(AUTHENTIC_LOG, "r") as f:
-            data = json.load(f)
-
-    data.append(item)
 
-    with open(AUTHENTIC_LOG, "w") as f:
-        json.dump(data, f, indent=2)
-
-
-# 🚀 Upload route
-@router.post("/upload_listing/")
-async def upload_product_listing(
-    image: UploadFile = File(...),
-    title: str = Form(...),
-    description: str = Form(...),
-    seller_id: str = Form(...),
-    product_id: str = Form(...)
-):
-    file_ext = image.filename.split('.')[-1]
-    filename = f"{uuid4()}.{file_ext}"
-    temp_path = os.path.join(UPLOAD_DIR, filename)
-
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+# 🧠 Blocking part of the upload: decode + model inference (runs on the inference pool)
+# Returns the API response and the verdict record; persisting the record is up to the caller.
+def _analyze_listing(data, file_ext, title, description, seller_id, product_id):
+    try:
+        image_features = extract_image_features(data)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode uploaded image: {e}")
 
     full_text = f"{title.strip()} - {description.strip()}"
-    similarity_score = compute_image_text_similarity(temp_path, full_text)
-    flags = compute_logo_flags(temp_path, title)
+    similarity_score = compute_image_text_similarity(image_features, full_text)
+    flags = compute_logo_flags(image_features, title)
 
     suspected_counterfeit = (
         similarity_score < 0.25 or
@@ -97,9 +77,10 @@ async def upload_product_listing(
     )
 
     if suspected_counterfeit:
-        evidence_path = os.path.join(EVIDENCE_DIR, filename)
-        shutil.move(temp_path, evidence_path)
-        log_flagged_product(
+        evidence_path = os.path.join(EVIDENCE_DIR, f"{uuid4()}.{file_ext}")
+        with open(evidence_path, "wb") as buffer:
+            buffer.write(data)
+        record = build_flagged_record(
             product_id=product_id,
             seller_id=seller_id,
             score=similarity_score,
@@ -110,16 +91,16 @@ async def upload_product_listing(
         )
         image_path = evidence_path
     else:
-        os.remove(temp_path)
-        log_authentic_product(
+        record = build_authentic_record(
             product_id=product_id,
             seller_id=seller_id,
             title=title,
-            description=description
+            description=description,
+            claimed_brand=flags["claimed_brand"]
         )
         image_path = None
 
-    return {
+    response = {
         "message": "Listing uploaded",
         "title": title,
         "description": description,
@@ -131,24 +112,176 @@ async def upload_product_listing(
         "top_3_brand_guesses": flags["top_3_brand_guesses"],
         "claimed_brand": flags["claimed_brand"],
         "brand_mismatch": flags["brand_mismatch"],
+        "clip_brand_guess": flags["clip_brand_guess"],
         "suspected_counterfeit": suspected_counterfeit,
         "image_path": image_path if image_path else "Deleted (not suspicious)"
     }
+    return response, record
+
+
+def _process_listing(data, file_ext, title, description, seller_id, product_id):
+    response, record = _analyze_listing(data, file_ext, title, description, seller_id, product_id)
+    verdict_store.append(record)
+    return response
+
+
+# 🚀 Upload route
+@router.post("/upload_listing/")
+async def upload_product_listing(
+    image: UploadFile = File(...),
+    title: str = Form(...),
+    description: str = Form(...),
+    seller_id: str = Form(...),
+    product_id: str = Form(...)
+):
+    file_ext = image.filename.split('.')[-1]
+    data = await image.read()
+    return await inference_pool.run(_process_listing, data, file_ext, title, description, seller_id, product_id)
+
+
+# 📦 One listing of a bulk upload (runs on the inference pool)
+def _analyze_bulk_listing(images, row):
+    filename = row["filename"]
+    if filename not in images:
+        raise HTTPException(status_code=400, detail=f"Image '{filename}' not found in upload")
+    return _analyze_listing(
+        images.read(filename), filename.split('.')[-1],
+        row["title"], row["description"], row["seller_id"], row["product_id"]
+    )
+
+
+async def _run_bulk_listing(images, index, row):
+    retries = 0
+    while True:
+        try:
+            response, record = await inference_pool.run(_analyze_bulk_listing, images, row)
+            return {"index": index, "filename": row.get("filename"), **response}, record
+        except HTTPException as e:
+            # Pool saturated: wait our turn (for a while) instead of failing the listing
+            if e.status_code == 503 and retries < BULK_MAX_POOL_RETRIES:
+                retries += 1
+                await asyncio.sleep(inference_pool.retry_after)
+                continue
+            return {"index": index, "filename": row.get("filename"), "error": e.detail}, None
+        except Exception as e:
+            return {"index": index, "filename": row.get("filename"), "error": str(e)}, None
+
+
+async def _stream_bulk_verdicts(images, rows):
+    pending = set()
+    next_index = 0
+    records = []
+    summary = {"total": len(rows), "flagged": 0, "authentic": 0, "errors": 0}
+
+    try:
+        while next_index < len(rows) or pending:
+            # Keep a bounded window in flight so one bulk upload cannot monopolise the pool
+            while next_index < len(rows) and len(pending) < BULK_CONCURRENCY:
+                pending.add(asyncio.ensure_future(_run_bulk_listing(images, next_index, rows[next_index])))
+                next_index += 1
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                line, record = task.result()
+                if record is None:
+                    summary["errors"] += 1
+                else:
+                    summary[record["status"]] += 1
+                    records.append(record)
+                yield json.dumps(line) + "\n"
+
+            if len(records) >= BULK_FLUSH_SIZE:
+                await run_in_threadpool(verdict_store.append_many, records)
+                records = []
+
+        if records:
+            await run_in_threadpool(verdict_store.append_many, records)
+            records = []
+        yield json.dumps({"summary": summary}) + "\n"
+    finally:
+        # Client disconnected or the stream failed: stop the listings still in flight
+        # and keep every verdict that was already sent back
+        for task in pending:
+            task.cancel()
+        if records:
+            await asyncio.shield(run_in_threadpool(verdict_store.append_many, records))
+        images.close()
+
+
+# 📦 Bulk upload route: a zip/tar archive or many images, plus a CSV/JSONL manifest
+# with one row per listing (filename, title, description, seller_id, product_id).
+# Verdicts are streamed back as NDJSON, one line per listing as soon as it finishes.
+@router.post("/bulk_upload/")
+async def bulk_upload_listings(
+    manifest: Optional[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    images: Optional[List[UploadFile]] = File(None)
+):
+    if archive is None and not images:
+        raise HTTPException(status_code=400, detail="Upload an archive or a list of images.")
+
+    if archive is not None:
+        # Keep our own copy: the request's temp file is closed before the stream finishes
+        archive_copy = tempfile.TemporaryFile()
+        await run_in_threadpool(shutil.copyfileobj, archive.file, archive_copy)
+        archive_copy.seek(0)
+        try:
+            listing_images = await run_in_threadpool(ListingImages.from_archive, archive_copy, archive.filename)
+        except Exception as e:
+            archive_copy.close()
+            raise HTTPException(status_code=400, detail=f"Could not open archive: {e}")
+    else:
+        listing_images = ListingImages.from_files({image.filename: await image.read() for image in images})
+
+    # From here on the stream owns the archive copy and closes it when done
+    try:
+        if manifest is not None:
+            manifest_name, manifest_data = manifest.filename, await manifest.read()
+        else:
+            manifest_name, manifest_data = listing_images.find_manifest()
+            if manifest_data is None:
+                raise HTTPException(status_code=400, detail=f"No manifest uploaded or found in archive (columns: {MANIFEST_FIELDS}).")
+
+        try:
+            rows = parse_manifest(manifest_data, manifest_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+    except Exception:
+        listing_images.close()
+        raise
+
+    return StreamingResponse(_stream_bulk_verdicts(listing_images, rows), media_type="application/x-ndjson")
 
 
 # 📥 GET flagged items
 @router.get("/flagged_items/")
-def get_flagged_items():
-    if os.path.exists(FLAGGED_LOG):
-        with open(FLAGGED_LOG, "r") as f:
-            return json.load(f)
-    return []
+def get_flagged_items(
+    seller_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    return verdict_store.query(
+        status="flagged", seller_id=seller_id, product_id=product_id,
+        brand=brand, since=since, until=until, limit=limit, offset=offset
+    )
 
 
 # 📥 GET authentic items
 @router.get("/authentic_items/")
-def get_authentic_items():
-    if os.path.exists(AUTHENTIC_LOG):
-        with open(AUTHENTIC_LOG, "r") as f:
-            return json.load(f)
-    return []
+def get_authentic_items(
+    seller_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    return verdict_store.query(
+        status="authentic", seller_id=seller_id, product_id=product_id,
+        brand=brand, since=since, until=until, limit=limit, offset=offset
+    )
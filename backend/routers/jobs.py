@@ -0,0 +1,74 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+
+from config import JOB_MAX_WAIT_SECONDS
+from routers.detect import _run_counterfeit_check
+from routers.ingestion import _process_listing
+from utils.job_queue import TERMINAL_STATES, PermanentJobError, job_queue
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+# 🧰 Job handlers: the same pipelines as the synchronous routes
+def _as_job(fn):
+    def handler(payload, input_bytes):
+        try:
+            return fn(input_bytes, **payload)
+        except HTTPException as e:
+            # Client errors (e.g. an undecodable image) will not succeed on retry
+            if e.status_code < 500:
+                raise PermanentJobError(e.detail)
+            raise
+    return handler
+
+
+job_queue.register("detect_counterfeit", _as_job(_run_counterfeit_check))
+job_queue.register("upload_listing", _as_job(_process_listing))
+
+
+# 🚀 Submit a counterfeit check; returns a job id straight away
+@router.post("/detect_counterfeit/", status_code=202)
+async def submit_counterfeit_check(
+    image: UploadFile = File(...),
+    title: str = Form(...),
+    description: str = Form(...)
+):
+    payload = {"ext": image.filename.split('.')[-1], "title": title, "description": description}
+    job_id = await run_in_threadpool(job_queue.submit, "detect_counterfeit", payload, await image.read())
+    return {"job_id": job_id, "status": "queued"}
+
+
+# 🚀 Submit a listing upload; the verdict is stored when the job finishes
+@router.post("/upload_listing/", status_code=202)
+async def submit_listing_upload(
+    image: UploadFile = File(...),
+    title: str = Form(...),
+    description: str = Form(...),
+    seller_id: str = Form(...),
+    product_id: str = Form(...)
+):
+    payload = {
+        "file_ext": image.filename.split('.')[-1], "title": title, "description": description,
+        "seller_id": seller_id, "product_id": product_id
+    }
+    job_id = await run_in_threadpool(job_queue.submit, "upload_listing", payload, await image.read())
+    return {"job_id": job_id, "status": "queued"}
+
+
+# 📥 Job status; pass `wait` to long-poll until the job finishes
+@router.get("/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT_SECONDS)):
+    deadline = asyncio.get_running_loop().time() + wait
+    while True:
+        job = await run_in_threadpool(job_queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        if job["status"] in TERMINAL_STATES or asyncio.get_running_loop().time() >= deadline:
+            return job
+        await asyncio.sleep(0.25)
+
+
+@router.get("/")
+def get_job_stats():
+    return job_queue.stats()
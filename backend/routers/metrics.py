@@ -1,5 +1,10 @@
 from fastapi import APIRouter
 
+from models.batching import batching_stats
+from models.counterfeit_detector import text_embedding_cache
+from models.feature_cache import image_feature_cache
+from utils.inference_pool import inference_pool
+
 router = APIRouter()
 
 @router.get("/api/metrics")
@@ -24,3 +29,13 @@ async def get_metrics():
             {"time": "2025-06-20 12:50", "event": "Complaint", "entity": "ORD-18277", "status": "Resolved"},
         ]
     }
+
+
+@router.get("/api/metrics/inference")
+async def get_inference_metrics():
+    return {
+        "inference_pool": inference_pool.stats(),
+        "batchers": batching_stats(),
+        "image_feature_cache": image_feature_cache.stats(),
+        "text_embedding_cache": text_embedding_cache.stats()
+    }
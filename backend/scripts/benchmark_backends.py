@@ -0,0 +1,103 @@
+# backend/scripts/benchmark_backends.py
+# Latency / throughput of every CPU inference backend for the three production models.
+# Run from the backend/ directory:  python scripts/benchmark_backends.py
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOGO_MODEL_PATH, CLIP_MODEL_NAME, REVIEW_SENTIMENT_MODEL
+from models.backends import BACKENDS, Forward, build_backend, relative_error
+
+
+def logo_model():
+    from torchvision import models
+    from models.logo_classifier import BRAND_LABELS
+
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, len(BRAND_LABELS))
+    if os.path.exists(LOGO_MODEL_PATH):
+        model.load_state_dict(torch.load(LOGO_MODEL_PATH, map_location="cpu"))
+    model.eval()
+    make_inputs = lambda n: (torch.rand(n, 3, 224, 224),)
+    return [("logo_classifier", model, make_inputs, ["image"])]
+
+
+def clip_models():
+    import clip
+
+    model, _ = clip.load(CLIP_MODEL_NAME, device="cpu")
+    titles = ["Nike Air Max 90 running shoes - brand new, original box", "HP laptop 16GB RAM"]
+    return [
+        ("clip_image", Forward(model, "encode_image"), lambda n: (torch.rand(n, 3, 224, 224),), ["image"]),
+        ("clip_text", Forward(model, "encode_text"), lambda n: (clip.tokenize((titles * n)[:n]),), ["tokens"]),
+    ]
+
+
+def sentiment_model():
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(REVIEW_SENTIMENT_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(REVIEW_SENTIMENT_MODEL).eval()
+    review = "Stopped working after two weeks and support never answered my emails. Would not buy again."
+
+    def make_inputs(n):
+        encoded = tokenizer([review] * n, return_tensors="pt", padding=True)
+        return encoded["input_ids"], encoded["attention_mask"]
+
+    return [("review_sentiment", Forward(model, output_attr="logits"), make_inputs, ["input_ids", "attention_mask"])]
+
+
+def measure(fn, inputs, iterations):
+    with torch.inference_mode():
+        for _ in range(3):  # warmup
+            fn(*inputs)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn(*inputs)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", nargs="+", default=["logo", "clip", "sentiment"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--onnx-dir", default="assets/onnx/benchmark")
+    args = parser.parse_args()
+
+    loaders = {"logo": logo_model, "clip": clip_models, "sentiment": sentiment_model}
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads\n")
+    print(f"{'model':<18}{'backend':<11}{'rel. error':>11}{'p50 ms (1)':>12}{'p99 ms (1)':>12}"
+          f"{f'items/s ({args.batch_size})':>16}{'speedup':>9}")
+
+    for key in args.models:
+        for name, module, make_inputs, input_names in loaders[key]():
+            baseline = None
+            for backend in BACKENDS:
+                candidate = build_backend(
+                    name, module, make_inputs(2), input_names, backend=backend,
+                    onnx_dir=args.onnx_dir, tolerance=float("inf")
+                )
+                error = relative_error(module, candidate, make_inputs(2))
+                single = measure(candidate, make_inputs(1), args.iterations)
+                batched = measure(candidate, make_inputs(args.batch_size), max(5, args.iterations // 5))
+                throughput = args.batch_size / statistics.median(batched)
+                baseline = baseline or throughput
+                print(f"{name:<18}{backend:<11}{error:>11.2e}"
+                      f"{statistics.median(single) * 1000:>12.2f}"
+                      f"{single[int(0.99 * (len(single) - 1))] * 1000:>12.2f}"
+                      f"{throughput:>16.1f}{throughput / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
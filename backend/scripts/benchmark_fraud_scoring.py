@@ -0,0 +1,98 @@
+# backend/scripts/benchmark_fraud_scoring.py
+# p50/p99 latency of single-customer fraud scoring: the original pandas + sklearn path
+# vs the lean path on the compiled forest.
+# Run from the backend/ directory:  python scripts/benchmark_fraud_scoring.py
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import joblib
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Post_Purchase.utils.schemas import CustomerFeatures
+from Post_Purchase.utils.scoring import FEATURE_ORDER, MODEL_PATH, SCALER_PATH, scoring_service
+
+sklearn_model = None
+sklearn_scaler = None
+
+
+def pandas_score(customer_id, features):
+    """The original implementation: one-row DataFrame, scaler.transform, predict + decision_function."""
+    df = pd.DataFrame({key: [getattr(features, key)] for key in FEATURE_ORDER})
+    X_scaled = sklearn_scaler.transform(df)
+    prediction = sklearn_model.predict(X_scaled)[0]
+    score = sklearn_model.decision_function(X_scaled)[0]
+    return {"customer_id": customer_id, "is_anomaly": bool(prediction == -1), "anomaly_score": float(score)}
+
+
+def random_customer(rng):
+    invoices = rng.randint(1, 200)
+    items = invoices * rng.randint(1, 30)
+    spend = items * rng.uniform(1, 20)
+    returned_invoices = rng.randint(0, invoices)
+    returned_items = rng.randint(0, items)
+    returned_value = returned_items * rng.uniform(1, 20)
+    return CustomerFeatures(
+        total_invoices=invoices, total_items=items, total_spend=spend,
+        distinct_products=rng.randint(1, items), days_as_customer=rng.randint(0, 400),
+        recency=rng.randint(0, 400), total_items_returned=returned_items,
+        total_value_returned=returned_value, total_return_invoices=returned_invoices,
+        return_rate_by_items=returned_items / items, return_rate_by_value=returned_value / spend,
+        return_rate_by_invoices=returned_invoices / invoices,
+    )
+
+
+def measure(fn, customers):
+    for customer in customers[:20]:  # warmup
+        fn("warmup", customer)
+    timings = []
+    for i, customer in enumerate(customers):
+        start = time.perf_counter()
+        fn(str(i), customer)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if scoring_service.model is None:
+        sys.exit("Fraud model not loaded, run ml_scripts/train_fraud_model.py first.")
+
+    global sklearn_model, sklearn_scaler
+    sklearn_model = joblib.load(MODEL_PATH)
+    sklearn_scaler = joblib.load(SCALER_PATH)
+
+    rng = random.Random(args.seed)
+    customers = [random_customer(rng) for _ in range(args.requests)]
+
+    # Both paths must agree before their speed means anything
+    for i, customer in enumerate(customers[:500]):
+        expected = pandas_score(str(i), customer)
+        actual = scoring_service.score_customer(str(i), customer)
+        assert expected["is_anomaly"] == actual["is_anomaly"], (i, expected, actual)
+        assert expected["anomaly_score"] == actual["anomaly_score"], (i, expected, actual)
+
+    print(f"{'path':<10}{'p50 µs':>10}{'p99 µs':>10}{'req/s':>10}")
+    baseline = None
+    for name, fn in (("pandas", pandas_score), ("lean", scoring_service.score_customer)):
+        timings = measure(fn, customers)
+        p50 = statistics.median(timings)
+        p99 = timings[int(0.99 * (len(timings) - 1))]
+        baseline = baseline or p50
+        print(f"{name:<10}{p50 * 1e6:>10.1f}{p99 * 1e6:>10.1f}{len(timings) / sum(timings):>10.0f}"
+              f"   ({baseline / p50:.1f}x p50)")
+
+
+if __name__ == "__main__":
+    main()
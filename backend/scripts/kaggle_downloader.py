@@ -1,8 +1,14 @@
 # backend/scripts/kaggle_downloader.py
 
-import kagglehub
+import argparse
+import hashlib
+import json
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import kagglehub
 import pandas as pd
 
 TARGET_BRANDS = [
@@ -10,10 +16,65 @@ TARGET_BRANDS = [
     "fila", "reebok", "pepsi", "nestle", "oreo", "coca_cola", "huawei"
 ]
 
+MANIFEST_NAME = "manifest.json"
+
+
 def normalize_brand(name):
     return name.strip().lower().replace(" ", "_")
 
-def download_and_prepare():
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_up_to_date(src, dst, verify_hash):
+    """Already prepared: same size (and, if asked, same content hash)."""
+    try:
+        if os.path.getsize(dst) != os.path.getsize(src):
+            return False
+    except OSError:
+        return False
+    return not verify_hash or file_sha1(src) == file_sha1(dst)
+
+
+def place_file(src, dst, link, verify_hash):
+    if is_up_to_date(src, dst, verify_hash):
+        return "skipped"
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return "linked"
+        except OSError:
+            pass  # e.g. across filesystems: fall back to a copy
+    shutil.copyfile(src, dst)
+    return "copied"
+
+
+def resolve_sources(df, gen_dir, out_dir, dest_dir):
+    """Brand filtering and source/destination paths for the whole mapping at once."""
+    df = df.assign(Brand=df["Brand"].astype(str).str.strip().str.lower().str.replace(" ", "_", regex=False))
+    df = df[df["Brand"].isin(TARGET_BRANDS)]
+
+    rel = df["Path"].astype(str).str.replace("\\", "/", regex=False)
+    generated = rel.str.contains("genLogoOutput", regex=False)
+    # Path inside genLogoOutput/ or output/, whichever the mapping points at
+    inner = rel.str.replace(r"^.*?(?:genLogoOutput|output)/", "", regex=True)
+    src = generated.map({True: gen_dir, False: out_dir}) + os.sep + inner.str.replace("/", os.sep, regex=False)
+    dst = dest_dir + os.sep + df["Brand"] + os.sep + inner.str.rsplit("/", n=1).str[-1]
+
+    files = pd.DataFrame({"Brand": df["Brand"], "Src": src, "Dst": dst})
+    # Same basename twice for a brand: the last mapping row wins, as with sequential copies
+    return files.drop_duplicates("Dst", keep="last")
+
+
+def download_and_prepare(workers=16, link=False, verify_hash=False):
+    start = time.perf_counter()
     path = kagglehub.dataset_download("prosperchuks/fakereal-logo-detection-dataset")
     print("✅ Dataset downloaded to:", path)
 
@@ -22,7 +83,7 @@ def download_and_prepare():
     out_dir = os.path.join(path, "output")
 
     # 🛠️ Fix: ensure destination is always backend/logo_dataset
-    project_root = os.path.dirname(os.path.dirname(__file__))  # Goes from scripts/ → backend/
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Goes from scripts/ → backend/
     dest_dir = os.path.join(project_root, "logo_dataset")
     os.makedirs(dest_dir, exist_ok=True)
 
@@ -37,26 +98,45 @@ def download_and_prepare():
         "Brand Name": "Brand"
     }).dropna(subset=["Path", "Brand"])
 
-    moved = 0
-    for _, row in df.iterrows():
-        brand = normalize_brand(row["Brand"])
-        if brand not in TARGET_BRANDS:
-            continue
+    files = resolve_sources(df, gen_dir, out_dir, dest_dir)
+    exists = files["Src"].map(os.path.exists)
+    missing = files[~exists]
+    files = files[exists]
+    for brand in files["Brand"].unique():
+        os.makedirs(os.path.join(dest_dir, brand), exist_ok=True)
 
-        rel_path = row["Path"]
-        if "genLogoOutput" in rel_path:
-            src_path = os.path.join(gen_dir, os.path.relpath(rel_path, "genLogoOutput"))
-        else:
-            src_path = os.path.join(out_dir, os.path.relpath(rel_path, "output"))
+    # ⚡ File copies are I/O bound: a thread pool keeps the disk busy
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(
+            lambda pair: place_file(pair[0], pair[1], link, verify_hash),
+            zip(files["Src"], files["Dst"])
+        ))
+    outcomes = pd.Series(outcomes, index=files.index, dtype=object)
 
-        dst_folder = os.path.join(dest_dir, brand)
-        os.makedirs(dst_folder, exist_ok=True)
+    manifest = {
+        "source": path,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "total_images": int(len(files)),
+        "brands": {brand: int(n) for brand, n in files["Brand"].value_counts().sort_index().items()},
+        "copied": int((outcomes == "copied").sum()),
+        "linked": int((outcomes == "linked").sum()),
+        "skipped": int((outcomes == "skipped").sum()),
+        "missing_sources": int(len(missing)),
+    }
+    with open(os.path.join(dest_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
 
-        if os.path.exists(src_path):
-            shutil.copy(src_path, os.path.join(dst_folder, os.path.basename(src_path)))
-            moved += 1
+    print(f"✅ {manifest['copied']} copied, {manifest['linked']} linked, {manifest['skipped']} already up to date "
+          f"({manifest['missing_sources']} missing sources) into {dest_dir} in {time.perf_counter() - start:.1f}s")
+    for brand, n in manifest["brands"].items():
+        print(f"   {brand:<12}{n:>6}")
 
-    print(f"✅ Copied {moved} images into {dest_dir}")
 
 if __name__ == "__main__":
-    download_and_prepare()
+    parser = argparse.ArgumentParser(description="Download the Kaggle logo dataset into backend/logo_dataset.")
+    parser.add_argument("--workers", type=int, default=16, help="Parallel file copies.")
+    parser.add_argument("--link", action="store_true", help="Hardlink instead of copying where possible.")
+    parser.add_argument("--verify-hash", action="store_true",
+                        help="Also compare SHA-1 of existing files, not just their size.")
+    args = parser.parse_args()
+    download_and_prepare(workers=args.workers, link=args.link, verify_hash=args.verify_hash)
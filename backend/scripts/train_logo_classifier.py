@@ -1,74 +1,278 @@
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
 import torch
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader
+from torchvision import transforms, models
+from torch.utils.data import DataLoader, Dataset, TensorDataset
 import torch.nn as nn
 import torch.optim as optim
 
 # Resolve paths relative to this script
-PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, "logo_dataset")
+CACHE_DIR = os.path.join(PROJECT_ROOT, "logo_cache")
 MODEL_PATH = os.path.join(PROJECT_ROOT, "assets", "logo_classifier.pth")
 
-# Create output folder if not exist
-os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+sys.path.append(PROJECT_ROOT)
+from models.logo_classifier import BRAND_LABELS
+from models.preprocessing import MODEL_INPUT_SIZE, decode_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-EPOCHS = 12
-BATCH_SIZE = 16
-LR = 1e-3
 
-# 🧠 Basic augmentations for generalization
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the ResNet18 logo classifier on logo_dataset/.")
+    parser.add_argument("--epochs", type=int, default=12)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="DataLoader worker processes for augmentation (and cache building).")
+    parser.add_argument("--val-fraction", type=float, default=0.15,
+                        help="Held-out share of each brand; the best checkpoint is picked on it.")
+    parser.add_argument("--freeze-backbone", action="store_true",
+                        help="Train only the final layer on cached backbone features (fast retrain).")
+    parser.add_argument("--init-from", default=None,
+                        help="Warm start from a checkpoint (e.g. the current model); "
+                             "the final layer is re-initialised if the brand count changed.")
+    parser.add_argument("--rebuild-cache", action="store_true", help="Decode the dataset again.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=MODEL_PATH)
+    return parser.parse_args()
+
+
+# 🗂️ Dataset listing in BRAND_LABELS order, so class indices match what the API expects
+def list_images():
+    paths, labels = [], []
+    for label, brand in enumerate(BRAND_LABELS):
+        folder = os.path.join(DATA_DIR, brand)
+        if not os.path.isdir(folder):
+            print(f"⚠️ No images for brand '{brand}' in {folder}")
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(folder, name))
+                labels.append(label)
+    return paths, np.asarray(labels, dtype=np.int64)
+
+
+def _decode(path):
+    # Same decode + resize as the API (models.preprocessing), kept as uint8 HWC
+    with open(path, "rb") as f:
+        data = f.read()
+    img = transforms.Resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))(decode_image(data))
+    return np.asarray(img, dtype=np.uint8)
+
+
+# 💾 Decoded dataset cache: one uint8 memmap, rebuilt only when the files change
+def load_image_cache(paths, workers, rebuild=False):
+    fingerprint = hashlib.sha1(json.dumps(
+        [[p, os.path.getsize(p), os.path.getmtime(p)] for p in paths] + [MODEL_INPUT_SIZE]
+    ).encode()).hexdigest()[:16]
+    images_path = os.path.join(CACHE_DIR, f"images-{fingerprint}.u8")
+    shape = (len(paths), MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3)
+
+    if os.path.exists(images_path) and not rebuild:
+        print(f"📦 Using decoded cache {images_path}")
+        return images_path, shape, fingerprint
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    start = time.perf_counter()
+    tmp_path = f"{images_path}.tmp"
+    images = np.memmap(tmp_path, dtype=np.uint8, mode="w+", shape=shape)
+    # --workers 0 means in-process DataLoaders, but decoding still needs one process
+    with Pool(max(1, workers)) as pool:
+        for i, array in enumerate(pool.imap(_decode, paths, chunksize=16)):
+            images[i] = array
+    images.flush()
+    del images
+    os.replace(tmp_path, images_path)
+    elapsed = time.perf_counter() - start
+    print(f"📦 Decoded {len(paths)} images into {images_path} in {elapsed:.1f}s ({len(paths) / elapsed:.0f} img/s)")
+    return images_path, shape, fingerprint
+
+
+class CachedLogoDataset(Dataset):
+    """
+    Serves images from the uint8 memmap; augmentation runs in the DataLoader workers.
+    """
+
+    def __init__(self, images_path, shape, indices, labels, augment):
+        self.images_path = images_path
+        self.shape = shape
+        self.indices = indices
+        self.labels = labels
+        self.augment = augment
+        self._images = None  # opened lazily, once per worker process
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if self._images is None:
+            self._images = np.memmap(self.images_path, dtype=np.uint8, mode="r", shape=self.shape)
+        index = self.indices[i]
+        image = torch.from_numpy(np.array(self._images[index])).permute(2, 0, 1)
+        if self.augment is not None:
+            image = self.augment(image)
+        # Same scaling as transforms.ToTensor
+        return image.float().div_(255), int(self.labels[index])
+
+
+# 🧠 Basic augmentations for generalization (on the cached 224x224 uint8 tensors)
+augment = transforms.Compose([
     transforms.RandomHorizontalFlip(),
     transforms.RandomRotation(15),
-    transforms.ToTensor()
 ])
 
-# Dataset
-dataset = datasets.ImageFolder(DATA_DIR, transform=transform)
-loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True)
 
-# Model setup
-model = models.resnet18(pretrained=True)
-model.fc = nn.Linear(model.fc.in_features, len(dataset.classes))
-model = model.to(DEVICE)
+def split_indices(labels, val_fraction, seed):
+    """Per-brand random split so every brand is represented in validation."""
+    rng = np.random.default_rng(seed)
+    train, val = [], []
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        n_val = int(round(len(members) * val_fraction)) if len(members) > 1 else 0
+        val.extend(members[:n_val])
+        train.extend(members[n_val:])
+    # int64 even when empty, so they can always index the feature/label tensors
+    return np.asarray(train, dtype=np.int64), np.asarray(val, dtype=np.int64)
 
-# Loss + optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=LR)
 
-best_acc = 0.0
+def build_model(init_from):
+    if init_from:
+        model = models.resnet18(weights=None)
+        state = torch.load(init_from, map_location="cpu")
+        n_old = state["fc.weight"].shape[0]
+        model.fc = nn.Linear(model.fc.in_features, n_old)
+        model.load_state_dict(state)
+        if n_old != len(BRAND_LABELS):
+            print(f"🔁 Checkpoint has {n_old} brands, now {len(BRAND_LABELS)}: re-initialising the final layer")
+            model.fc = nn.Linear(model.fc.in_features, len(BRAND_LABELS))
+        print(f"🔁 Warm start from {init_from}")
+    else:
+        model = models.resnet18(weights=models.ResNet18_Weights.DEFAULT)
+        model.fc = nn.Linear(model.fc.in_features, len(BRAND_LABELS))
+    return model.to(DEVICE)
 
-# Training loop
-print(f"🟡 Training on {len(dataset.classes)} classes ({dataset.class_to_idx})")
-for epoch in range(EPOCHS):
-    model.train()
+
+def save_checkpoint(model, path):
+    # The API hot-reloads this file by mtime, so never let it see a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    torch.save({k: v.cpu() for k, v in model.state_dict().items()}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def run_epoch(model, loader, criterion, optimizer=None):
+    training = optimizer is not None
+    model.train(training)
     total, correct, running_loss = 0, 0, 0.0
-    for imgs, labels in loader:
-        imgs, labels = imgs.to(DEVICE), labels.to(DEVICE)
-        optimizer.zero_grad()
-        outputs = model(imgs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-        running_loss += loss.item()
-        _, preds = outputs.max(1)
-        correct += (preds == labels).sum().item()
-        total += labels.size(0)
-
-    acc = correct / total
-    print(f"✅ Epoch {epoch+1}/{EPOCHS} - Loss: {running_loss:.4f} - Accuracy: {acc:.4f}")
-    
-    if acc > best_acc:
-        best_acc = acc
-        print(f"New best accuracy: {best_acc:.4f} - Saving model...")
-
-        # Save the model state
-        torch.save(model.state_dict(), MODEL_PATH)
-
-# Save model
-torch.save(model.state_dict(), MODEL_PATH)
-print(f"🎉 Model saved to {MODEL_PATH}")
+    start = time.perf_counter()
+    with torch.set_grad_enabled(training):
+        for inputs, labels in loader:
+            inputs, labels = inputs.to(DEVICE, non_blocking=True), labels.to(DEVICE, non_blocking=True)
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+            if training:
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+
+            running_loss += loss.item() * labels.size(0)
+            correct += (outputs.argmax(1) == labels).sum().item()
+            total += labels.size(0)
+    elapsed = time.perf_counter() - start
+    return running_loss / max(total, 1), correct / max(total, 1), total / elapsed
+
+
+# ⚡ Head-only mode: the frozen backbone runs once per image, then only fc is trained
+def backbone_features(model, images_path, shape, fingerprint, init_from, workers, batch_size):
+    weights_tag = "imagenet"
+    if init_from:
+        with open(init_from, "rb") as f:
+            weights_tag = hashlib.sha1(f.read()).hexdigest()[:12]
+    features_path = os.path.join(CACHE_DIR, f"features-{fingerprint}-{weights_tag}.npy")
+    if os.path.exists(features_path):
+        print(f"📦 Using cached backbone features {features_path}")
+        return torch.from_numpy(np.load(features_path))
+
+    fc, model.fc = model.fc, nn.Identity()
+    dataset = CachedLogoDataset(images_path, shape, np.arange(shape[0]), np.zeros(shape[0], dtype=np.int64), None)
+    loader = DataLoader(dataset, batch_size=batch_size * 4, num_workers=workers,
+                        pin_memory=DEVICE.type == "cuda")
+    model.eval()
+    chunks = []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for inputs, _ in loader:
+            chunks.append(model(inputs.to(DEVICE)).cpu())
+    model.fc = fc
+    features = torch.cat(chunks)
+    np.save(features_path, features.numpy())
+    elapsed = time.perf_counter() - start
+    print(f"📦 Extracted backbone features for {shape[0]} images in {elapsed:.1f}s ({shape[0] / elapsed:.0f} img/s)")
+    return features
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(args.seed)
+
+    paths, labels = list_images()
+    if not len(paths):
+        sys.exit(f"No images found under {DATA_DIR}")
+    images_path, shape, fingerprint = load_image_cache(paths, args.workers, args.rebuild_cache)
+    train_idx, val_idx = split_indices(labels, args.val_fraction, args.seed)
+
+    model = build_model(args.init_from)
+    criterion = nn.CrossEntropyLoss()
+
+    if args.freeze_backbone:
+        features = backbone_features(model, images_path, shape, fingerprint, args.init_from,
+                                     args.workers, args.batch_size)
+        targets = torch.from_numpy(labels)
+        train_loader = DataLoader(TensorDataset(features[train_idx], targets[train_idx]),
+                                  batch_size=args.batch_size, shuffle=True)
+        val_loader = DataLoader(TensorDataset(features[val_idx], targets[val_idx]), batch_size=256)
+        trainable = model.fc
+        optimizer = optim.Adam(model.fc.parameters(), lr=args.lr)
+    else:
+        loader_options = dict(num_workers=args.workers, pin_memory=DEVICE.type == "cuda",
+                              persistent_workers=args.workers > 0)
+        train_loader = DataLoader(CachedLogoDataset(images_path, shape, train_idx, labels, augment),
+                                  batch_size=args.batch_size, shuffle=True, **loader_options)
+        val_loader = DataLoader(CachedLogoDataset(images_path, shape, val_idx, labels, None),
+                                batch_size=args.batch_size * 4, **loader_options)
+        trainable = model
+        optimizer = optim.Adam(model.parameters(), lr=args.lr)
+
+    best_acc = -1.0
+    print(f"🟡 Training on {len(BRAND_LABELS)} classes ({len(train_idx)} train / {len(val_idx)} val images, "
+          f"{'head only' if args.freeze_backbone else 'full network'}, {args.workers} workers, {DEVICE})")
+    for epoch in range(args.epochs):
+        train_loss, train_acc, train_rate = run_epoch(trainable, train_loader, criterion, optimizer)
+        if len(val_idx):
+            val_loss, val_acc, _ = run_epoch(trainable, val_loader, criterion)
+        else:
+            val_loss, val_acc = train_loss, train_acc  # tiny dataset: nothing held out
+        print(f"✅ Epoch {epoch+1}/{args.epochs} - Loss: {train_loss:.4f} - Accuracy: {train_acc:.4f} "
+              f"- Val loss: {val_loss:.4f} - Val accuracy: {val_acc:.4f} - {train_rate:.0f} img/s")
+
+        if val_acc > best_acc:
+            best_acc = val_acc
+            print(f"New best validation accuracy: {best_acc:.4f} - Saving model...")
+            save_checkpoint(model, args.output)
+
+    print(f"🎉 Best model (val accuracy {best_acc:.4f}) saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import os
+import tarfile
+import threading
+import zipfile
+
+MANIFEST_FIELDS = ["filename", "title", "description", "seller_id", "product_id"]
+MANIFEST_NAMES = ("manifest.csv", "manifest.jsonl")
+
+
+def parse_manifest(data: bytes, name: str) -> list:
+    """
+    Parse a listing manifest (CSV with a header row, or JSONL) into a list of dicts.
+    """
+    text = data.decode("utf-8-sig")
+    if name.lower().endswith((".jsonl", ".ndjson")):
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {number} is not an object")
+        # Short CSV rows come back with None for the trailing columns
+        missing = [field for field in MANIFEST_FIELDS if row.get(field) is None]
+        if missing:
+            raise ValueError(f"Row {number} is missing columns: {missing}")
+    return rows
+
+
+class ListingImages:
+    """
+    Looks up listing images by manifest filename in a zip/tar archive or a set of
+    uploaded files. Reads are serialised because tarfile handles are not thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._archive = None
+        self._fileobj = None
+
+    @classmethod
+    def from_files(cls, files: dict):
+        images = cls()
+        for name, data in files.items():
+            images._add(name, lambda data=data: data)
+        return images
+
+    @classmethod
+    def from_archive(cls, fileobj, name: str):
+        images = cls()
+        if name.lower().endswith(".zip"):
+            archive = zipfile.ZipFile(fileobj)
+            for member in archive.namelist():
+                if not member.endswith("/"):
+                    images._add(member, lambda member=member: archive.read(member))
+        else:
+            archive = tarfile.open(fileobj=fileobj, mode="r:*")
+            for member in archive.getmembers():
+                if member.isfile():
+                    images._add(member.name, lambda member=member: archive.extractfile(member).read())
+        images._archive = archive
+        images._fileobj = fileobj
+        return images
+
+    def _add(self, name, reader):
+        self._readers[name] = reader
+        # Manifests usually refer to images by bare filename
+        self._readers.setdefault(os.path.basename(name), reader)
+
+    def __contains__(self, name):
+        return name in self._readers
+
+    def read(self, name) -> bytes:
+        with self._lock:
+            return self._readers[name]()
+
+    def close(self):
+        # Under the read lock, so a listing still being read is not cut off mid-read
+        with self._lock:
+            for handle in (self._archive, self._fileobj):
+                if handle is not None:
+                    handle.close()
+            self._archive = self._fileobj = None
+
+    def find_manifest(self):
+        for name in MANIFEST_NAMES:
+            if name in self._readers:
+                return name, self.read(name)
+        return None, None
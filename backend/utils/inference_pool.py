@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from config import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_RETRY_AFTER
+
+
+class InferencePool:
+    """
+    Runs blocking model inference on a bounded thread pool so the event loop stays free.
+
+    At most `max_workers` jobs run at once and `max_queue` more may wait; anything
+    beyond that is rejected straight away with a 503 and a Retry-After header.
+    """
+
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE,
+                 retry_after=INFERENCE_RETRY_AFTER):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def _try_acquire(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        if not self._try_acquire():
+            raise HTTPException(
+                status_code=503,
+                detail="Inference capacity exhausted, please retry shortly.",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        # The slot is freed when the work itself finishes, not when the caller stops
+        # waiting, so disconnected clients cannot push the pool past its bound.
+        def job():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._release()
+
+        try:
+            future = self._executor.submit(job)
+        except Exception:
+            self._release()
+            raise
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "rejected": self._rejected,
+            }
+
+
+# Create a single instance shared by all routers
+inference_pool = InferencePool()
@@ -0,0 +1,265 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from uuid import uuid4
+
+from config import (
+    JOB_DB_PATH, JOB_INPUT_DIR, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_LEASE_SECONDS, JOB_RETRY_BACKOFF_SECONDS
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    input_path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    lease_until REAL,
+    not_before REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, for job databases created before them
+_MIGRATIONS = {
+    "owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+    "lease_until": "ALTER TABLE jobs ADD COLUMN lease_until REAL",
+    "not_before": "ALTER TABLE jobs ADD COLUMN not_before REAL NOT NULL DEFAULT 0",
+}
+
+TERMINAL_STATES = ("done", "failed")
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying cannot help (e.g. invalid input)."""
+
+
+class JobQueue:
+    """
+    Durable job queue backed by SQLite, drained by a pool of local worker threads.
+
+    A claimed job carries a lease that its process renews while it runs. Jobs
+    survive a restart or a crashed process: a "running" job whose lease has expired
+    belonged to a worker that died, and is queued again until it runs out of
+    attempts. Failed attempts are retried after an exponential backoff.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, input_dir=JOB_INPUT_DIR, workers=JOB_WORKERS,
+                 max_attempts=JOB_MAX_ATTEMPTS, lease_seconds=JOB_LEASE_SECONDS,
+                 retry_backoff=JOB_RETRY_BACKOFF_SECONDS):
+        self.path = path
+        self.input_dir = input_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff = retry_backoff
+        # Identifies this process's workers in the lease columns
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._claim_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(input_dir, exist_ok=True)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        """
+        `handler(payload, input_bytes)` runs the job and returns a JSON-serialisable result.
+        """
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, input_bytes=None):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job_id = str(uuid4())
+        input_path = None
+        if input_bytes is not None:
+            input_path = os.path.join(self.input_dir, f"{job_id}.bin")
+            with open(input_path, "wb") as f:
+                f.write(input_bytes)
+
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, input_path, max_attempts, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), input_path, self.max_attempts, time.time())
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+        }
+        # ⏱️ Per-job timing
+        if row["started_at"]:
+            job["queued_seconds"] = round(row["started_at"] - row["created_at"], 3)
+        if row["finished_at"] and row["started_at"]:
+            job["run_seconds"] = round(row["finished_at"] - row["started_at"], 3)
+        return job
+
+    def stats(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": len(self._threads), **{status: count for status, count in rows}}
+
+    def start(self):
+        if self._threads:
+            return
+        self._recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+
+    def _recover(self):
+        # Only jobs whose lease ran out: other processes may be running the rest
+        now = time.time()
+        expired = "status = 'running' AND (lease_until IS NULL OR lease_until < ?)"
+        conn = self._conn()
+        with conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, "
+                f"error = 'worker crashed, retrying' WHERE {expired} AND attempts < max_attempts",
+                (now,)
+            ).rowcount
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', owner = NULL, lease_until = NULL, "
+                f"error = 'worker crashed', finished_at = ? WHERE {expired}",
+                (now, now)
+            ).rowcount
+        if requeued or failed:
+            print(f"Job queue recovery: {requeued} jobs re-queued, {failed} failed.")
+            self._wakeup.set()
+
+    def _heartbeat(self):
+        # Renew our leases well before they expire, and pick up jobs of dead workers
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                conn = self._conn()
+                with conn:
+                    conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                        (time.time() + self.lease_seconds, self.owner)
+                    )
+                self._recover()
+            except sqlite3.Error as e:
+                print(f"[ERROR] Job lease renewal failed: {e}")
+
+    def _claim(self):
+        # One claimer at a time inside this process; the UPDATE guard covers other processes
+        with self._claim_lock:
+            conn = self._conn()
+            now = time.time()
+            with conn:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                    "owner = ?, lease_until = ? WHERE id = ? AND status = 'queued'",
+                    (now, self.owner, now + self.lease_seconds, row["id"])
+                ).rowcount
+            return row if claimed else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Guarded by the owner: a job whose lease was lost now belongs to someone else
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+                "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(),
+                 job_id, self.owner)
+            )
+
+    def _work(self):
+        while True:
+            row = self._claim()
+            if row is None:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            self._run(row)
+
+    def _run(self, row):
+        attempts = row["attempts"] + 1
+        try:
+            input_bytes = None
+            if row["input_path"]:
+                with open(row["input_path"], "rb") as f:
+                    input_bytes = f.read()
+            result = self._handlers[row["kind"]](json.loads(row["payload"]), input_bytes)
+        except PermanentJobError as e:
+            self._finish(row["id"], "failed", error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            if attempts < row["max_attempts"]:
+                delay = self.retry_backoff * 2 ** (attempts - 1)
+                conn = self._conn()
+                with conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, not_before = ?, "
+                        "owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                        (f"attempt {attempts} failed: {e}, retrying in {delay:.0f}s",
+                         time.time() + delay, row["id"], self.owner)
+                    )
+                return
+            self._finish(row["id"], "failed", error=str(e))
+        else:
+            self._finish(row["id"], "done", result=result)
+
+        if row["input_path"] and os.path.exists(row["input_path"]):
+            os.remove(row["input_path"])
+
+
+# Create a single instance shared by all routers
+job_queue = JobQueue()
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+
+from config import VERDICT_DB_PATH, FLAGGED_LOG, AUTHENTIC_LOG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    product_id TEXT,
+    seller_id TEXT,
+    brand TEXT,
+    timestamp TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_status_time ON verdicts (status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_verdicts_seller ON verdicts (status, seller_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_verdicts_product ON verdicts (status, product_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_verdicts_brand ON verdicts (status, brand, timestamp);
+"""
+
+
+class VerdictStore:
+    """
+    Append-only store of listing verdicts ("flagged" / "authentic") backed by SQLite.
+
+    Each append is a single indexed INSERT, so its cost does not grow with history,
+    and WAL mode lets concurrent uploads write without losing each other's rows.
+    Records are returned exactly as they were appended.
+    """
+
+    def __init__(self, path=VERDICT_DB_PATH, legacy_logs=None):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+        if legacy_logs and self.count() == 0:
+            self._import_legacy(legacy_logs)
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(record):
+        return (
+            record["status"],
+            record.get("product_id"),
+            record.get("seller_id"),
+            record.get("claimed_brand"),
+            record.get("timestamp", ""),
+            json.dumps(record),
+        )
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO verdicts (status, product_id, seller_id, brand, timestamp, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row(record) for record in records]
+            )
+
+    @staticmethod
+    def _where(status, seller_id, product_id, brand, since, until):
+        # Brands are stored the way compute_logo_flags normalises them
+        if brand is not None:
+            brand = brand.strip().lower()
+        # Timestamps are stored as ISO strings, which sort chronologically
+        since = since.isoformat() if hasattr(since, "isoformat") else since
+        until = until.isoformat() if hasattr(until, "isoformat") else until
+        clauses, params = [], []
+        for column, value in (("status", status), ("seller_id", seller_id),
+                              ("product_id", product_id), ("brand", brand)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, status=None, seller_id=None, product_id=None, brand=None,
+              since=None, until=None, limit=100, offset=0):
+        where, params = self._where(status, seller_id, product_id, brand, since, until)
+        # Newest first, so the default page (what the dashboard shows) has the latest uploads
+        cursor = self._conn().execute(
+            f"SELECT payload FROM verdicts{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [json.loads(payload) for (payload,) in cursor]
+
+    def count(self, status=None, seller_id=None, product_id=None, brand=None, since=None, until=None):
+        where, params = self._where(status, seller_id, product_id, brand, since, until)
+        return self._conn().execute(f"SELECT COUNT(*) FROM verdicts{where}", params).fetchone()[0]
+
+    def _import_legacy(self, legacy_logs):
+        for status, log_path in legacy_logs.items():
+            if not os.path.exists(log_path):
+                continue
+            with open(log_path, "r") as f:
+                records = json.load(f)
+            for record in records:
+                record.setdefault("status", status)
+            self.append_many(records)
+            print(f"Imported {len(records)} {status} verdicts from {log_path}")
+
+
+# Create a single instance shared by all routers
+verdict_store = VerdictStore(legacy_logs={"flagged": FLAGGED_LOG, "authentic": AUTHENTIC_LOG})
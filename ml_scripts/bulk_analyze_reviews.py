@@ -1,48 +1,109 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import textwrap
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
 import pandas as pd
 import torch
-import numpy as np
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import os
-import json
 
-print("--- Starting Bulk Review Analysis (No Date) ---")
+# Reuse the backend's inference backends (int8 / ONNX Runtime)
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.append(BACKEND_DIR)
+from models.backends import BACKENDS, Forward, build_backend
+
+MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+labels = ['negative', 'neutral', 'positive']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Flag reviews whose sentiment contradicts their star rating.")
+    parser.add_argument("--input", default="data/amazon.csv", help="Review dataset (CSV).")
+    parser.add_argument("--output-dir", default="backend/data", help="Where the JSON reports are written.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Reviews per forward pass.")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads in single-process mode (default: torch's choice).")
+    parser.add_argument("--max-length", type=int, default=512, help="Token limit per review.")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="CPU inference backend; int8/ONNX results are checked against fp32 before use.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes, each with its own model copy pinned to its own cores (1 = in-process).")
+    parser.add_argument("--shard-size", type=int, default=5000, help="CSV rows per shard.")
+    parser.add_argument("--checkpoint-dir", default="data/review_shards",
+                        help="Per-shard results; shards already there are skipped on rerun.")
+    parser.add_argument("--fresh", action="store_true", help="Discard existing shard checkpoints first.")
+    parser.add_argument("--store", default=None,
+                        help="Incremental mode: SQLite file of sentiments per review text. Only reviews whose "
+                             "text is not in the store are scored; the reports join the input against the store.")
+    return parser.parse_args()
+
 
 # --- 1. Load the Sentiment Model ---
-print("Loading sentiment analysis model...")
-try:
-    MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+def load_model(threads=None, backend="torch"):
+    """
+    Returns the tokenizer and a classifier mapping (input_ids, attention_mask) to logits.
+    """
+    if threads:
+        torch.set_num_threads(threads)
     tokenizer = AutoTokenizer.from_pretrained(MODEL)
     model = AutoModelForSequenceClassification.from_pretrained(MODEL)
     model.eval()
-    labels = ['negative', 'neutral', 'positive']
-    print("Model loaded successfully.")
-except Exception as e:
-    print(f"Error loading model: {e}. Ensure you have an internet connection.")
-    exit()
-
-# --- 2. Load and Prepare the Dataset ---
-try:
-    df = pd.read_csv("data/amazon.csv")
-    print(f"Loaded {df.shape[0]} rows from amazon.csv")
-except FileNotFoundError:
-    print("Error: 'data/amazon.csv' not found. Please place your dataset in a 'data' folder in the project root.")
-    exit()
-
-# Data Cleaning
-df = df.dropna(subset=['review_content'])
-df['review_title'] = df['review_title'].fillna('')
-df['review_content'] = df['review_content'].astype(str).str.strip()
-df['review'] = (df['review_title'] + '. ' + df['review_content']).str.strip()
-df = df[df['review'].str.len() > 20].reset_index(drop=True)
-print(f"Processing {df.shape[0]} valid reviews...")
+    example = tokenizer(
+        ["Terrible, broke after a day.", "Great value, works exactly as described and arrived early."],
+        return_tensors="pt", padding=True
+    )
+    classifier = build_backend(
+        "review_sentiment", Forward(model, output_attr="logits"),
+        (example["input_ids"], example["attention_mask"]), ["input_ids", "attention_mask"],
+        backend=backend, version=MODEL.replace("/", "-"),
+        onnx_dir=os.path.join(BACKEND_DIR, "assets", "onnx")
+    )
+    return tokenizer, classifier
+
+
+# --- 2. Prepare the Dataset ---
+def clean_reviews(df):
+    df = df.dropna(subset=['review_content']).copy()
+    df['review_title'] = df['review_title'].fillna('')
+    df['review_content'] = df['review_content'].astype(str).str.strip()
+    df['review'] = (df['review_title'] + '. ' + df['review_content']).str.strip()
+    return df[df['review'].str.len() > 20].reset_index(drop=True)
+
 
 # --- 3. Define Analysis Functions ---
-def get_sentiment(text):
-    inputs = tokenizer(text, return_tensors="pt", max_length=512, truncation=True, padding=True)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-    probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
-    return labels[np.argmax(probs)]
+def get_sentiments(texts, tokenizer, model, batch_size=32, max_length=512, log_every=1000):
+    """
+    Batched sentiment labels for `texts`, returned in input order.
+
+    Reviews are processed shortest-first so every batch pads only to the length of
+    its own longest review rather than to the longest review in the dataset.
+    """
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    sentiments = [None] * len(texts)
+    done = 0
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = tokenizer(
+                [texts[i] for i in batch_idx],
+                return_tensors="pt", max_length=max_length, truncation=True, padding=True
+            )
+            predictions = model(inputs["input_ids"], inputs["attention_mask"]).argmax(dim=1).tolist()
+            for i, prediction in zip(batch_idx, predictions):
+                sentiments[i] = labels[prediction]
+
+            done += len(batch_idx)
+            if log_every and (done // log_every) != ((done - len(batch_idx)) // log_every):
+                print(f"  Processed {done}/{len(texts)} reviews...")
+    return sentiments
+
 
 def detect_mismatch(row):
     try:
@@ -52,41 +113,334 @@ def detect_mismatch(row):
     except:
         return 0
 
-# --- 4. Perform Bulk Analysis ---
-print("Analyzing sentiment for all reviews... (This may take a while)")
-sentiments = []
-for i, review in enumerate(df['review']):
-    if (i + 1) % 100 == 0:
-        print(f"  Processed {i+1}/{df.shape[0]} reviews...")
-    sentiments.append(get_sentiment(review))
-df['sentiment'] = sentiments
-
-print("Sentiment analysis complete. Flagging mismatches...")
-df['is_suspicious'] = df.apply(detect_mismatch, axis=1)
-
-# --- 5. Generate and Save Reports ---
-print("Generating reports...")
-
-output_dir = 'backend/data'
-os.makedirs(output_dir, exist_ok=True)
-
-# a) Flagged Reviews Report (No Timestamp)
-flagged_df = df[df['is_suspicious'] == 1].copy()
-report_path = os.path.join(output_dir, 'flagged_reviews_report.json')
-# REMOVED timestamp from the saved columns
-flagged_df_to_save = flagged_df[['rating', 'sentiment', 'review']]
-flagged_df_to_save.to_json(report_path, orient='records', indent=4)
-print(f"Found {len(flagged_df)} suspicious reviews. Report saved to {report_path}")
-
-# b) Statistics Report for Pie Chart
-stats_counts = df['is_suspicious'].value_counts()
-stats_report = {
-    'real_count': int(stats_counts.get(0, 0)),
-    'fake_count': int(stats_counts.get(1, 0))
-}
-stats_report_path = os.path.join(output_dir, 'review_stats_report.json')
-with open(stats_report_path, 'w') as f:
-    json.dump(stats_report, f, indent=4)
-print(f"Generated aggregate stats. Report saved to {stats_report_path}")
-
-print("\n--- Bulk analysis complete! ---")
\ No newline at end of file
+
+# --- 4. Sharded Analysis with Checkpoints ---
+class ReviewStore:
+    """
+    Persistent sentiment per review text, keyed by a hash of the text, so a rerun
+    only pays model cost (and write cost) for texts it has never seen. Ratings and
+    verdicts are not stored: they come from the current input on every run.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sentiments (review_hash TEXT PRIMARY KEY, sentiment TEXT NOT NULL)"
+            )
+            # Stores written before only the sentiment was kept: carry it over, drop the rest
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews'").fetchone():
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO sentiments (review_hash, sentiment) SELECT review_hash, sentiment FROM reviews"
+                )
+                self.conn.execute("DROP TABLE reviews")
+
+    @staticmethod
+    def review_hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def sentiments(self, hashes, chunk=500):
+        known = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), chunk):
+            part = hashes[start:start + chunk]
+            rows = self.conn.execute(
+                f"SELECT review_hash, sentiment FROM sentiments WHERE review_hash IN ({','.join('?' * len(part))})", part
+            )
+            known.update(rows)
+        return known
+
+    def add(self, pairs):
+        """Stores (review_hash, sentiment) pairs; hashes already present are left alone."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sentiments (review_hash, sentiment) VALUES (?, ?)", pairs
+            )
+
+
+# Per-process state, set up once by _init_worker; the model is only loaded if a shard needs it
+_worker = {}
+
+
+def _init_worker(core_sets, batch_size, max_length, threads=None, store_path=None, backend="torch"):
+    cores = core_sets.get() if core_sets is not None else None
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    _worker.update(
+        threads=len(cores) if cores else threads, batch_size=batch_size, max_length=max_length, backend=backend,
+        store=ReviewStore(store_path) if store_path else None
+    )
+
+
+def _worker_model():
+    if "model" not in _worker:
+        _worker["tokenizer"], _worker["model"] = load_model(_worker["threads"], _worker["backend"])
+    return _worker["tokenizer"], _worker["model"]
+
+
+def _shard_path(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, f"shard_{index:05d}.json")
+
+
+def shard_result(df):
+    """Report form of a scored chunk: the flagged rows plus the counts."""
+    flagged = df[df['is_suspicious'] == 1]
+    return {
+        "real_count": int((df['is_suspicious'] == 0).sum()),
+        "fake_count": int(len(flagged)),
+        "flagged": flagged[['rating', 'sentiment', 'review']].to_dict(orient='records'),
+    }
+
+
+def score_shard(index, chunk, checkpoint_dir):
+    """
+    Score one CSV chunk and checkpoint its result: the flagged rows plus the counts.
+    Each distinct review text is scored once; in incremental mode texts already in
+    the store are not scored at all.
+    """
+    df = clean_reviews(chunk)
+    df['review_hash'] = df['review'].map(ReviewStore.review_hash)
+    store = _worker["store"]
+    known = store.sentiments(df['review_hash'].unique()) if store else {}
+
+    todo = df[~df['review_hash'].isin(known)].drop_duplicates('review_hash')
+    if len(todo):
+        tokenizer, model = _worker_model()
+        scored = list(zip(todo['review_hash'], get_sentiments(
+            todo['review'].tolist(), tokenizer, model,
+            batch_size=_worker["batch_size"], max_length=_worker["max_length"], log_every=0
+        )))
+        known.update(scored)
+        if store:
+            store.add(scored)
+    df['sentiment'] = df['review_hash'].map(known)
+    df['is_suspicious'] = df.apply(detect_mismatch, axis=1) if len(df) else []
+
+    result = shard_result(df)
+    # Write-then-rename so a crash never leaves a half-written shard that looks complete
+    path = _shard_path(checkpoint_dir, index)
+    with open(path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+    return index, len(df), result["fake_count"], len(todo)
+
+
+def prepare_checkpoints(args):
+    """
+    Reuse checkpoints only if they were produced from the same input and shard size,
+    and against the same store: shards skipped on a rerun must already be in it.
+    """
+    stat = os.stat(args.input)
+    signature = {
+        "input": os.path.abspath(args.input), "size": stat.st_size, "mtime": stat.st_mtime,
+        "shard_size": args.shard_size, "model": MODEL,
+        "store": os.path.abspath(args.store) if args.store else None,
+        "store_exists": bool(args.store) and os.path.exists(args.store),
+    }
+    signature_path = os.path.join(args.checkpoint_dir, "run.json")
+    if os.path.exists(signature_path) and not args.fresh:
+        with open(signature_path) as f:
+            if json.load(f) == signature:
+                return
+        print("Input, shard size or store changed since the last run; discarding old checkpoints.")
+    shutil.rmtree(args.checkpoint_dir, ignore_errors=True)
+    os.makedirs(args.checkpoint_dir)
+    with open(signature_path, "w") as f:
+        json.dump(signature, f)
+
+
+def pinned_core_sets(workers):
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cores) // workers)
+    return [cores[i * per_worker:(i + 1) * per_worker] or cores for i in range(workers)]
+
+
+# --- 5. Generate and Save Reports (incrementally) ---
+class ReportWriter:
+    """
+    Streams shard results into the two report files as the run progresses.
+
+    Flagged reviews are appended to a JSON array in a working file next to the report,
+    and a complete copy replaces the report from time to time (write-then-rename, like
+    the stats file with its running totals). Readers never see a half-written file, and
+    the API can serve partial results while a long run is still going.
+
+    A copy is published at most every `publish_interval` seconds, and only once the
+    working file has grown by PUBLISH_GROWTH since the last one, so the copies add up
+    to a small multiple of the final report size rather than one full copy per shard.
+    """
+
+    PUBLISH_GROWTH = 1.25
+
+    def __init__(self, output_dir, publish_interval=30.0):
+        os.makedirs(output_dir, exist_ok=True)
+        self.report_path = os.path.join(output_dir, 'flagged_reviews_report.json')
+        self.stats_report_path = os.path.join(output_dir, 'review_stats_report.json')
+        self.real_count = 0
+        self.fake_count = 0
+        self.shards = 0
+        self.publish_interval = publish_interval
+        self._published_size = 0
+        self._published_at = 0.0
+        self._work_path = self.report_path + ".work"
+        self._report = open(self._work_path, "wb+")
+        self._report.write(b"[")
+        # Offset of the closing "\n]", where the next records get written
+        self._end = self._report.tell()
+        self._has_records = False
+        self._report.write(b"\n]")
+        self._publish()
+        self._write_stats()
+
+    def add_shard(self, shard):
+        if shard["flagged"]:
+            records = ",\n".join(textwrap.indent(json.dumps(record, indent=4), "    ") for record in shard["flagged"])
+            self._report.seek(self._end)
+            self._report.write(((",\n" if self._has_records else "\n") + records).encode("utf-8"))
+            self._end = self._report.tell()
+            self._report.write(b"\n]")
+            self._report.truncate()
+            self._has_records = True
+            if (time.monotonic() - self._published_at >= self.publish_interval
+                    and self._report.tell() >= self._published_size * self.PUBLISH_GROWTH):
+                self._publish()
+        self.real_count += shard["real_count"]
+        self.fake_count += shard["fake_count"]
+        self.shards += 1
+        self._write_stats()
+
+    def _publish(self):
+        self._report.flush()
+        shutil.copyfile(self._work_path, self.report_path + ".tmp")
+        os.replace(self.report_path + ".tmp", self.report_path)
+        self._published_size = self._report.tell()
+        self._published_at = time.monotonic()
+
+    def _write_stats(self):
+        # b) Statistics Report for Pie Chart (running totals)
+        stats_report = {
+            'real_count': self.real_count,
+            'fake_count': self.fake_count
+        }
+        with open(self.stats_report_path + ".tmp", 'w') as f:
+            json.dump(stats_report, f, indent=4)
+        os.replace(self.stats_report_path + ".tmp", self.stats_report_path)
+
+    def close(self):
+        self._report.close()
+        os.replace(self._work_path, self.report_path)
+        print(f"Found {self.fake_count} suspicious reviews. Report saved to {self.report_path}")
+        print(f"Generated aggregate stats from {self.shards} shards. Report saved to {self.stats_report_path}")
+
+
+def run_shards(args, writer=None):
+    """
+    Stream the CSV chunk by chunk, scoring shards without a checkpoint, and feed
+    every shard to `writer` (if any) in file order as soon as it and all earlier ones are done.
+    """
+    chunks = enumerate(pd.read_csv(args.input, chunksize=args.shard_size, dtype={'rating': str}))
+    reviews = flagged = shards = scored = 0
+    start = time.perf_counter()
+
+    def emit(index, result=None):
+        nonlocal reviews, flagged, shards, scored
+        if result is not None:
+            _, n_reviews, n_flagged, n_scored = result
+            reviews, flagged, shards, scored = reviews + n_reviews, flagged + n_flagged, shards + 1, scored + n_scored
+            rate = reviews / max(time.perf_counter() - start, 1e-9)
+            print(f"  Shard {index} done: {n_reviews} reviews ({n_scored} scored by the model), "
+                  f"{n_flagged} flagged ({rate:.1f} reviews/sec overall)")
+        if writer is not None:
+            with open(_shard_path(args.checkpoint_dir, index)) as f:
+                writer.add_shard(json.load(f))
+
+    if args.workers <= 1:
+        _init_worker(None, args.batch_size, args.max_length, args.threads, args.store, args.backend)
+        for index, chunk in chunks:
+            if os.path.exists(_shard_path(args.checkpoint_dir, index)):
+                emit(index)
+            else:
+                emit(index, score_shard(index, chunk, args.checkpoint_dir))
+    else:
+        core_sets = multiprocessing.Queue()
+        for cores in pinned_core_sets(args.workers):
+            core_sets.put(cores)
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker,
+                                 initargs=(core_sets, args.batch_size, args.max_length, None, args.store, args.backend)) as pool:
+            # index -> Future (None for shards already checkpointed), in file order
+            in_order = {}
+            in_flight = 0
+            next_index = 0
+            for index, chunk in chunks:
+                if os.path.exists(_shard_path(args.checkpoint_dir, index)):
+                    in_order[index] = None
+                else:
+                    in_order[index] = pool.submit(score_shard, index, chunk, args.checkpoint_dir)
+                    in_flight += 1
+                # Only a couple of chunks per worker are read ahead, so memory stays bounded
+                while in_flight >= 2 * args.workers or (next_index in in_order and in_order[next_index] is None):
+                    future = in_order.pop(next_index)
+                    if future is not None:
+                        in_flight -= 1
+                    emit(next_index, future.result() if future is not None else None)
+                    next_index += 1
+            while next_index in in_order:
+                future = in_order.pop(next_index)
+                emit(next_index, future.result() if future is not None else None)
+                next_index += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {shards} new shards ({reviews} reviews, {scored} scored by the model, {flagged} flagged) in {elapsed:.1f}s "
+          f"({reviews / max(elapsed, 1e-9):.1f} reviews/sec).")
+
+
+def store_report_shards(args):
+    """
+    Report shards for the current input, with every sentiment looked up in the store:
+    the same rows, duplicates and ratings as a full run, without the model.
+    """
+    store = ReviewStore(args.store)
+    for chunk in pd.read_csv(args.input, chunksize=args.shard_size, dtype={'rating': str}):
+        df = clean_reviews(chunk)
+        df['review_hash'] = df['review'].map(ReviewStore.review_hash)
+        df['sentiment'] = df['review_hash'].map(store.sentiments(df['review_hash'].unique()))
+        df['is_suspicious'] = df.apply(detect_mismatch, axis=1) if len(df) else []
+        yield shard_result(df)
+
+
+def main():
+    args = parse_args()
+    print("--- Starting Bulk Review Analysis (No Date) ---")
+
+    if not os.path.exists(args.input):
+        print(f"Error: '{args.input}' not found. Please place your dataset in a 'data' folder in the project root.")
+        exit()
+
+    prepare_checkpoints(args)
+    print(f"Analyzing {args.input} in shards of {args.shard_size} rows with {args.workers} worker(s), "
+          f"batch size {args.batch_size}. Checkpoints: {args.checkpoint_dir}")
+    if args.store:
+        # Incremental mode: score the delta, then rebuild both reports from the store
+        run_shards(args)
+        print(f"Rebuilding reports from {args.store}...")
+        writer = ReportWriter(args.output_dir)
+        try:
+            for shard in store_report_shards(args):
+                writer.add_shard(shard)
+        finally:
+            writer.close()
+    else:
+        writer = ReportWriter(args.output_dir)
+        try:
+            run_shards(args, writer)
+        finally:
+            writer.close()
+
+    print("\n--- Bulk analysis complete! ---")
+
+
+if __name__ == "__main__":
+    main()